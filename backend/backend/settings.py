@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -90,6 +91,34 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHE_BACKENDS = {
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+}
+
+# Version stamps, cached counts and the pantry change sequence are
+# stored without a timeout and updated with incr, so deployments need a
+# shared cache with atomic incr that never evicts keys without a TTL:
+# Redis with maxmemory-policy volatile-lru. The per-process locmem
+# fallback only suits a single development server.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+if CACHE_BACKEND == 'locmem':
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': 100000}
+
+# Directory for prebuilt snapshots shared between worker processes
+SNAPSHOT_ROOT = Path(os.getenv(
+    'SNAPSHOT_ROOT', os.path.join(tempfile.gettempdir(), 'foodgram_snapshots')))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -135,6 +164,13 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/media'
 
+# Resized image variants are generated by a background thread pool
+IMAGE_VARIANTS_ASYNC = True
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+# Similar recipe lists are refreshed after commit by a background thread
+SIMILAR_RECIPES_ASYNC = True
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
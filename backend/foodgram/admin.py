@@ -1,17 +1,15 @@
 from django.contrib import admin
-from django.db.models import aggregates
 
-from . import models
+from . import models, invalidation
 
 
 @admin.register(models.Profile)
 class ProfileAdmin(admin.ModelAdmin):
     empty_value_display = '-empty-'
-    list_display = ['username', 'email', 'avatar', 'subscribers']
+    list_display = ['username', 'email', 'avatar', 'subscribers', 'recipes']
+    list_select_related = ('user',)
     fieldsets = [(None, {'fields': ['avatar']})]
     search_fields = ('user__username', 'user__email')
-    queryset = models.User.objects.annotate(
-        subscribers_count=aggregates.Count('subscribers'))
 
     @admin.display(description='Имя пользователя')
     def username(self, obj):
@@ -21,9 +19,14 @@ class ProfileAdmin(admin.ModelAdmin):
     def email(self, obj):
         return obj.user.email
 
-    @admin.display(description='Кол-во подписчиков')
+    @admin.display(
+        description='Кол-во подписчиков', ordering='subscribers_count')
     def subscribers(self, obj):
-        return self.queryset.get(pk=obj.user.pk).subscribers_count
+        return obj.subscribers_count
+
+    @admin.display(description='Кол-во рецептов', ordering='recipes_count')
+    def recipes(self, obj):
+        return obj.recipes_count
 
     def has_delete_permission(self, request, obj=None):
         return False
@@ -37,6 +40,12 @@ class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ['user', 'subscribed_to']
     search_fields = ('user__username', 'subscribed_to__username')
 
+    def get_readonly_fields(self, request, obj=None):
+        # Subscriber counters and feeds follow only added and removed rows
+        if obj is not None:
+            return ('user', 'subscribed_to')
+        return ()
+
 
 @admin.register(models.Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
@@ -53,24 +62,57 @@ class RecipeIngredientAdmin(admin.ModelAdmin):
     def measurement_unit(self, obj):
         return obj.ingredient.measurement_unit
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # A row moved to another recipe changes both recipes
+        invalidation.recipes_changed(
+            {obj.recipe_id, form.initial.get('recipe', obj.recipe_id)})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidation.recipes_changed([obj.recipe_id])
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = set(queryset.values_list('recipe_id', flat=True))
+        super().delete_queryset(request, queryset)
+        invalidation.recipes_changed(recipe_ids)
+
 
 @admin.register(models.Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ['name', 'author_name', 'favorites']
+    list_display = ['name', 'author_name', 'favorites', 'in_carts']
+    list_select_related = ('author',)
     search_fields = ('name', 'author__username')
-    queryset = models.Recipe.objects.annotate(
-        favorites_count=aggregates.Count('favorites'))
 
     @admin.display(description='Автор')
     def author_name(self, obj):
         return obj.author.username
 
-    @admin.display(description='Кол-во добавлений в избранное')
+    def get_readonly_fields(self, request, obj=None):
+        # Recipe counters and feeds follow the author a recipe was added by
+        if obj is not None:
+            return ('author',)
+        return ()
+
+    @admin.display(
+        description='Кол-во добавлений в избранное',
+        ordering='favorites_count')
     def favorites(self, obj):
-        return self.queryset.get(pk=obj.pk).favorites_count
+        return obj.favorites_count
+
+    @admin.display(
+        description='Кол-во добавлений в корзину', ordering='in_carts_count')
+    def in_carts(self, obj):
+        return obj.in_carts_count
 
 
 @admin.register(models.Favorite, models.ShoppingCartItem)
 class UserRecipeListAdmin(admin.ModelAdmin):
     list_display = ['__str__', 'user', 'recipe']
     search_fields = ('user__username', 'recipe__name')
+
+    def get_readonly_fields(self, request, obj=None):
+        # Shopping lists and counters follow only added and removed items
+        if obj is not None:
+            return ('user', 'recipe')
+        return ()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+RECIPES_VERSION = 'recipes-version'
+INGREDIENTS_VERSION = 'ingredients-version'
+SHOPPING_LISTS_VERSION = 'shopping-lists-version'
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def set_versions(keys):
+    cache.set_many({key: time.time_ns() for key in keys}, timeout=None)
+
+
+def bump_version(*keys):
+    # Bumping again on commit drops anything cached from the
+    # pre-commit state by concurrent readers
+    set_versions(keys)
+    transaction.on_commit(lambda: set_versions(keys))
+
+
+def get_recipe_version_key(recipe_id):
+    return f'recipe-version:{recipe_id}'
+
+
+def get_author_version_key(user_id):
+    return f'author-version:{user_id}'
+
+
+def get_snapshot_path(name, version, suffix=''):
+    return settings.SNAPSHOT_ROOT / f'{name}-{version}{suffix}'
+
+
+def write_snapshot(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent)
+    with os.fdopen(fd, 'wb') as file:
+        file.write(content)
+    os.replace(temp_path, path)
+
+
+def remove_old_snapshots(name, version, suffix=''):
+    for path in settings.SNAPSHOT_ROOT.glob(f'{name}-*{suffix}'):
+        path_version = path.name[len(name) + 1:len(path.name) - len(suffix)]
+        if path_version.isdigit() and int(path_version) < version:
+            path.unlink(missing_ok=True)
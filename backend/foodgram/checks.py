@@ -0,0 +1,21 @@
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+
+# Backends whose incr is atomic: version stamps and the pantry change
+# sequence rely on concurrent increments never returning the same value
+ATOMIC_INCR_BACKENDS = (RedisCache, LocMemCache)
+
+
+@checks.register(checks.Tags.caches)
+def check_cache_incr(app_configs, **kwargs):
+    if isinstance(caches['default'], ATOMIC_INCR_BACKENDS):
+        return []
+    return [checks.Error(
+        'The default cache backend has no atomic incr.',
+        hint='Use RedisCache, or LocMemCache for a single process.',
+        obj=type(caches['default']).__name__,
+        id='foodgram.E001',
+    )]
@@ -0,0 +1,71 @@
+from typing import NamedTuple
+
+from django.db.models import F, IntegerField, OuterRef, Subquery, Value
+from django.db.models import aggregates
+from django.db.models.functions import Coalesce, Greatest
+
+from . import models
+
+
+class Counter(NamedTuple):
+    # target.field counts the model rows whose link points at target_link
+    model: type
+    link: str
+    target: type
+    target_link: str
+    field: str
+
+
+FAVORITES = Counter(
+    models.Favorite, 'recipe', models.Recipe, 'pk', 'favorites_count')
+IN_CARTS = Counter(
+    models.ShoppingCartItem, 'recipe', models.Recipe, 'pk', 'in_carts_count')
+SUBSCRIBERS = Counter(
+    models.Subscription, 'subscribed_to',
+    models.Profile, 'user', 'subscribers_count')
+RECIPES = Counter(
+    models.Recipe, 'author', models.Profile, 'user', 'recipes_count')
+
+COUNTERS = (FAVORITES, IN_CARTS, SUBSCRIBERS, RECIPES)
+
+
+def increment(counter, key, delta):
+    counter.target.objects.filter(**{counter.target_link: key}).update(**{
+        counter.field: Greatest(F(counter.field) + delta, Value(0))
+    })
+
+
+def update(sender, instance, delta):
+    for counter in COUNTERS:
+        if counter.model is sender:
+            increment(counter, getattr(instance, f'{counter.link}_id'), delta)
+
+
+def get_expected(counter):
+    return Coalesce(
+        Subquery(
+            counter.model.objects
+            .filter(**{counter.link: OuterRef(counter.target_link)})
+            .order_by()
+            .values(counter.link)
+            .annotate(count=aggregates.Count('pk'))
+            .values('count'),
+            output_field=IntegerField()),
+        0)
+
+
+def get_drift(counter):
+    return list(
+        counter.target.objects
+        .annotate(expected=get_expected(counter))
+        .exclude(**{counter.field: F('expected')})
+        .order_by('pk')
+        .values_list('pk', 'expected', counter.field)
+    )
+
+
+def reconcile(counter, pks=None):
+    targets = counter.target.objects.all()
+    if pks is not None:
+        targets = targets.filter(pk__in=pks)
+    return targets.update(**{counter.field: get_expected(counter)})
@@ -0,0 +1,55 @@
+from django.db import connection
+
+from . import models
+
+
+BACKFILL_LIMIT = 100
+
+
+def get_tables():
+    quote = connection.ops.quote_name
+    return {
+        'feed': quote(models.FeedEntry._meta.db_table),
+        'recipe': quote(models.Recipe._meta.db_table),
+        'subscription': quote(models.Subscription._meta.db_table),
+    }
+
+
+INSERT_SQL = (
+    'INSERT INTO {feed} (user_id, recipe_id, author_id, date_posted) '
+    '{select} '
+    'ON CONFLICT (user_id, recipe_id) DO NOTHING'
+)
+
+
+def fan_out(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    tables = get_tables()
+    select = (
+        'SELECT s.user_id, r.id, r.author_id, r.date_posted '
+        'FROM {recipe} r '
+        'JOIN {subscription} s ON s.subscribed_to_id = r.author_id '
+        'WHERE r.id IN ({ids})'
+    ).format(ids=', '.join(['%s'] * len(recipe_ids)), **tables)
+    with connection.cursor() as cursor:
+        cursor.execute(INSERT_SQL.format(select=select, **tables), recipe_ids)
+
+
+def backfill(user_id, author_id, limit=BACKFILL_LIMIT):
+    tables = get_tables()
+    select = (
+        'SELECT * FROM ('
+        'SELECT %s, id, author_id, date_posted FROM {recipe} '
+        'WHERE author_id = %s ORDER BY date_posted DESC, id DESC LIMIT %s'
+        ') latest WHERE true'
+    ).format(**tables)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            INSERT_SQL.format(select=select, **tables),
+            [user_id, author_id, limit])
+
+
+def prune(user_id, author_id):
+    models.FeedEntry.objects.filter(user=user_id, author=author_id).delete()
@@ -1,5 +1,23 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import BooleanField, Count, F, Q
+from django.db.models.expressions import RawSQL
+from rest_framework.exceptions import ValidationError
 from rest_framework.filters import BaseFilterBackend, SearchFilter
 
+from . import models
+
+
+MAX_RECIPES_LIMIT = 100
+MAX_FILTER_INGREDIENTS = 100
+SEARCH_CONFIG = 'russian'
+# Largest value of a BigAutoField primary key
+MAX_ID = 2 ** 63 - 1
+RECIPE_ORDERINGS = {
+    'popular': ('-favorites_count', '-date_posted', '-id'),
+    'in_carts': ('-in_carts_count', '-date_posted', '-id'),
+}
+
 
 def param_equals(request, param, value):
     return request.query_params.get(param, '') == value
@@ -13,11 +31,87 @@ def param_get_id(request, param):
         return None
 
 
+def param_get_ids(request, param, max_count=MAX_FILTER_INGREDIENTS):
+    value = request.query_params.get(param, '')
+    if not value:
+        return None
+    try:
+        ids = sorted({int(item) for item in value.split(',')})
+    except ValueError:
+        ids = []
+    if not ids or ids[0] < 1 or ids[-1] > MAX_ID or len(ids) > max_count:
+        raise ValidationError(
+            {param: 'comma separated list of ingredient ids required'})
+    return ids
+
+
+def param_get_limit(request, param, default, maximum):
+    value = request.query_params.get(param)
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        raise ValidationError({param: 'positive integer required'})
+    return min(limit, maximum)
+
+
+def get_recipes_limit(request):
+    return param_get_limit(
+        request, 'recipes_limit', MAX_RECIPES_LIMIT, MAX_RECIPES_LIMIT)
+
+
+def search_recipes(queryset, text):
+    if connection.vendor != 'postgresql':
+        return queryset.filter(
+            Q(name__icontains=text) | Q(text__icontains=text))
+
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    return (
+        queryset
+        .filter(search_vector=query)
+        .annotate(search_rank=SearchRank(F('search_vector'), query))
+        .order_by('-search_rank', '-date_posted', '-id')
+    )
+
+
+def filter_ingredients(queryset, ids, match_all):
+    if connection.vendor == 'postgresql':
+        # ingredient_ids is a trigger maintained bigint[] column with a GIN
+        # index
+        operator = '@>' if match_all else '&&'
+        return queryset.filter(RawSQL(
+            f'{models.Recipe._meta.db_table}.ingredient_ids '
+            f'{operator} %s::bigint[]',
+            (ids,), output_field=BooleanField()))
+
+    recipe_ids = models.RecipeIngredient.objects.filter(
+        ingredient_id__in=ids).values('recipe_id')
+    if match_all:
+        recipe_ids = (
+            recipe_ids
+            .annotate(matched=Count('ingredient_id'))
+            .filter(matched=len(ids))
+            .values('recipe_id')
+        )
+    return queryset.filter(pk__in=recipe_ids)
+
+
 class RecipeFilterBackend(BaseFilterBackend):
     def filter_queryset(self, request, queryset, view):
+        search = request.query_params.get('search', '').strip()
+        all_ingredients = param_get_ids(request, 'ingredients')
+        any_ingredients = param_get_ids(request, 'any_ingredients')
         filter_author = param_get_id(request, 'author')
         filter_cart = param_equals(request, 'is_in_shopping_cart', '1')
         filter_favorites = param_equals(request, 'is_favorited', '1')
+        ordering = request.query_params.get('ordering')
+        if ordering is not None and ordering not in RECIPE_ORDERINGS:
+            raise ValidationError({
+                'ordering': 'one of {} required'.format(
+                    ', '.join(RECIPE_ORDERINGS))})
 
         if filter_author is not None:
             queryset = queryset.filter(author__pk=filter_author)
@@ -32,6 +126,19 @@ class RecipeFilterBackend(BaseFilterBackend):
         elif filter_cart or filter_favorites:
             queryset = queryset.none()
 
+        if all_ingredients is not None:
+            queryset = filter_ingredients(
+                queryset, all_ingredients, match_all=True)
+        if any_ingredients is not None:
+            queryset = filter_ingredients(
+                queryset, any_ingredients, match_all=False)
+
+        if search:
+            queryset = search_recipes(queryset, search)
+
+        if ordering is not None:
+            queryset = queryset.order_by(*RECIPE_ORDERINGS[ordering])
+
         return queryset
 
 
@@ -0,0 +1,159 @@
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from . import caching, models
+
+
+logger = logging.getLogger(__name__)
+
+VARIANT_SIZES = {
+    'recipes': {
+        'card': (480, 480),
+        'detail': (1200, 1200),
+    },
+    'users': {
+        'avatar': (160, 160),
+    },
+}
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+# Larger sources are rejected before any pixel data is decoded
+MAX_SOURCE_PIXELS = 40_000_000
+IMAGE_FIELDS = {
+    models.Recipe: ('image', 'image_variants'),
+    models.Profile: ('avatar', 'avatar_variants'),
+}
+
+_executor = None
+
+
+def check_size(image):
+    width, height = image.size
+    if width * height > MAX_SOURCE_PIXELS:
+        raise ValueError(f'image too large: {width}x{height}')
+
+
+def get_variant_name(name, variant, extension):
+    directory = name.split('/')[0]
+    stem = posixpath.splitext(posixpath.basename(name))[0]
+    return posixpath.join(
+        directory, 'variants', f'{stem}_{variant}.{extension}')
+
+
+def generate_variants(field_file):
+    directory = field_file.name.split('/')[0]
+    sizes = VARIANT_SIZES[directory]
+    storage = field_file.storage
+
+    with storage.open(field_file.name) as file:
+        image = Image.open(file)
+        check_size(image)
+        # JPEG sources are scaled down by the decoder itself, up to 1/8,
+        # other formats are reduced by an integer factor after decoding
+        largest = max(sizes.values())
+        image.draft(image.mode, largest)
+        factor = min(
+            image.width // (largest[0] * 2), image.height // (largest[1] * 2))
+        if factor > 1:
+            image = image.reduce(factor)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    variants = {'source': field_file.name}
+    for variant, size in sizes.items():
+        resized = image.copy()
+        resized.thumbnail(size, Image.Resampling.LANCZOS)
+        variants[variant] = {}
+        for extension, (image_format, options) in VARIANT_FORMATS.items():
+            if image_format == 'JPEG' and resized.mode != 'RGB':
+                output_image = resized.convert('RGB')
+            else:
+                output_image = resized
+            buffer = BytesIO()
+            output_image.save(buffer, image_format, **options)
+            variants[variant][extension] = storage.save(
+                get_variant_name(field_file.name, variant, extension),
+                ContentFile(buffer.getvalue()))
+    return variants
+
+
+def needs_variants(instance):
+    field_name, variants_name = IMAGE_FIELDS[type(instance)]
+    field_file = getattr(instance, field_name)
+    variants = getattr(instance, variants_name)
+    return bool(field_file) and variants.get('source') != field_file.name
+
+
+def process_instance(model, pk, force=False):
+    field_name, variants_name = IMAGE_FIELDS[model]
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not getattr(instance, field_name):
+        return
+    if not force and not needs_variants(instance):
+        return
+    field_file = getattr(instance, field_name)
+    variants = generate_variants(field_file)
+    # The image may have been replaced while the variants were generated
+    if model.objects.filter(pk=pk, **{field_name: field_file.name}).update(
+        **{variants_name: variants}
+    ):
+        invalidate(instance)
+
+
+def invalidate(instance):
+    if isinstance(instance, models.Recipe):
+        caching.bump_version(caching.get_recipe_version_key(instance.pk))
+    else:
+        caching.bump_version(
+            caching.get_author_version_key(instance.user_id))
+
+
+def run_task(model, pk):
+    try:
+        process_instance(model, pk)
+    except Exception:
+        logger.exception(
+            'Failed to generate image variants for %s %s', model, pk)
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            thread_name_prefix='image-variants')
+    return _executor
+
+
+def schedule_variants(instance):
+    model, pk = type(instance), instance.pk
+    if settings.IMAGE_VARIANTS_ASYNC:
+        transaction.on_commit(
+            lambda: get_executor().submit(run_task, model, pk))
+    else:
+        transaction.on_commit(lambda: process_instance(model, pk))
+
+
+def get_variant_urls(field_file, variants, request=None):
+    urls = {}
+    for variant, files in variants.items():
+        if variant == 'source':
+            continue
+        urls[variant] = {}
+        for extension, name in files.items():
+            url = field_file.storage.url(name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[variant][extension] = url
+    return urls if variants.get('source') == field_file.name else {}
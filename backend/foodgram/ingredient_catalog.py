@@ -0,0 +1,58 @@
+import gzip
+
+from rest_framework.renderers import JSONRenderer
+
+from . import caching, models, serializers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+SNAPSHOT_NAME = 'catalog'
+ENCODINGS = {
+    'identity': ('.json', None),
+    'gzip': ('.json.gz', gzip.compress),
+}
+if brotli is not None:
+    ENCODINGS['br'] = ('.json.br', brotli.compress)
+
+
+def build_snapshot(version):
+    content = JSONRenderer().render(serializers.IngredientSerializer(
+        models.Ingredient.objects.all(), many=True).data)
+    for suffix, compress in ENCODINGS.values():
+        caching.write_snapshot(
+            caching.get_snapshot_path(SNAPSHOT_NAME, version, suffix),
+            content if compress is None else compress(content))
+    for suffix, _ in ENCODINGS.values():
+        caching.remove_old_snapshots(SNAPSHOT_NAME, version, suffix)
+
+
+def get_snapshot(version, encoding):
+    suffix, _ = ENCODINGS[encoding]
+    path = caching.get_snapshot_path(SNAPSHOT_NAME, version, suffix)
+    if not path.exists():
+        build_snapshot(version)
+    return path.read_bytes()
+
+
+def get_etag(version, encoding):
+    # Each content-coding is a different representation and needs its
+    # own strong validator
+    if encoding == 'identity':
+        return f'"{version}"'
+    return f'"{version}-{encoding}"'
+
+
+def get_encoding(accept_encoding):
+    accepted = set()
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00'):
+            accepted.add(coding.strip().lower())
+    for encoding in ('br', 'gzip'):
+        if encoding in ENCODINGS and encoding in accepted:
+            return encoding
+    return 'identity'
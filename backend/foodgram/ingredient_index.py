@@ -0,0 +1,123 @@
+import mmap
+import struct
+from bisect import bisect_left
+from functools import cached_property
+
+from . import caching, models
+
+
+SNAPSHOT_NAME = 'ingredients'
+SNAPSHOT_SUFFIX = '.idx'
+MAGIC = b'FGI1'
+HEADER = struct.Struct('<4sI')
+OFFSET = struct.Struct('<I')
+SEPARATOR = b'\0'
+
+
+def normalize(name):
+    return name.strip().casefold()
+
+
+def build_snapshot(path):
+    records = sorted(
+        (normalize(name).encode(), name, pk, unit)
+        for pk, name, unit in models.Ingredient.objects.values_list(
+            'pk', 'name', 'measurement_unit')
+    )
+    data = bytearray()
+    offsets = []
+    for key, name, pk, unit in records:
+        offsets.append(len(data))
+        data += SEPARATOR.join(
+            (key, str(pk).encode(), name.encode(), unit.encode()))
+    offsets.append(len(data))
+
+    caching.write_snapshot(path, b''.join((
+        HEADER.pack(MAGIC, len(records)),
+        *(OFFSET.pack(offset) for offset in offsets),
+        data,
+    )))
+
+
+class IngredientIndex:
+    def __init__(self, path, version):
+        self.version = version
+        with open(path, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not an ingredient index')
+        self.data_start = HEADER.size + OFFSET.size * (self.size + 1)
+
+    def get_record(self, position):
+        start, end = struct.unpack_from(
+            '<2I', self.buffer, HEADER.size + OFFSET.size * position)
+        return self.buffer[self.data_start + start:self.data_start + end]
+
+    def get_key(self, position):
+        record = self.get_record(position)
+        return record[:record.index(SEPARATOR)]
+
+    def search(self, prefix):
+        prefix = normalize(prefix).encode()
+        position = bisect_left(
+            range(self.size), prefix, key=self.get_key)
+        results = []
+        while position < self.size:
+            key, pk, name, unit = self.get_record(position).split(SEPARATOR)
+            if not key.startswith(prefix):
+                break
+            results.append({
+                'id': int(pk),
+                'name': name.decode(),
+                'measurement_unit': unit.decode(),
+            })
+            position += 1
+        return results
+
+    @cached_property
+    def positions(self):
+        positions = {}
+        for position in range(self.size):
+            pk = self.get_record(position).split(SEPARATOR, 2)[1]
+            positions[int(pk)] = position
+        return positions
+
+    def get_many(self, ids):
+        ingredients = {}
+        for pk in ids:
+            position = self.positions.get(pk)
+            if position is not None:
+                _, _, name, unit = self.get_record(position).split(SEPARATOR)
+                ingredients[pk] = models.Ingredient(
+                    pk=pk, name=name.decode(), measurement_unit=unit.decode())
+        return ingredients
+
+
+_index = None
+
+
+def get_index():
+    global _index
+    version = caching.get_version(caching.INGREDIENTS_VERSION)
+    if _index is None or _index.version != version:
+        path = caching.get_snapshot_path(
+            SNAPSHOT_NAME, version, SNAPSHOT_SUFFIX)
+        if not path.exists():
+            build_snapshot(path)
+            caching.remove_old_snapshots(
+                SNAPSHOT_NAME, version, SNAPSHOT_SUFFIX)
+        _index = IngredientIndex(path, version)
+    return _index
+
+
+def search(prefix):
+    return get_index().search(prefix)
+
+
+def get_many(ids):
+    try:
+        index = get_index()
+    except OSError:
+        return models.Ingredient.objects.in_bulk(ids)
+    return index.get_many(ids)
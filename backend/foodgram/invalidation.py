@@ -0,0 +1,17 @@
+from . import caching, pantry, shopping_list, similarity
+
+
+def recipes_changed(recipe_ids, shopping_lists=True, similar=True):
+    # Everything derived from recipe ingredients, for writes that bypass
+    # the model signals or change ingredients of existing recipes
+    recipe_ids = set(recipe_ids)
+    if not recipe_ids:
+        return
+    if shopping_lists:
+        shopping_list.rebuild_recipes(recipe_ids)
+    caching.bump_version(
+        caching.RECIPES_VERSION,
+        *(caching.get_recipe_version_key(pk) for pk in recipe_ids))
+    pantry.record_change(recipe_ids)
+    if similar:
+        similarity.schedule_refresh(recipe_ids)
@@ -0,0 +1,90 @@
+import random
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from foodgram import filters, models
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure recipe search latency for a growing number of recipes. '
+        'Generated data is rolled back.'
+    )
+    search_term = 'бенчмарк'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+',
+            default=[1000, 10000, 100000],
+            help='Recipe counts to measure at')
+        parser.add_argument(
+            '--matches', type=int, default=10,
+            help='Number of recipes matching the search term')
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Number of timed queries per size')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.words = list(
+            models.Ingredient.objects.values_list('name', flat=True))
+        self.stdout.write(f'Database: {connection.vendor}')
+
+        with transaction.atomic():
+            self.author = models.User.objects.create(
+                username=f'benchmark-{uuid.uuid4().hex[:8]}')
+            self.create_recipes(options['matches'], matching=True)
+            created = options['matches']
+            for size in sorted(options['sizes']):
+                self.create_recipes(size - created)
+                created = max(size, created)
+                self.analyze()
+                timings = self.measure(options['repeat'])
+                self.stdout.write(
+                    f'{created:>10} recipes: '
+                    f'median {statistics.median(timings):.2f} ms, '
+                    f'max {max(timings):.2f} ms')
+            transaction.set_rollback(True)
+
+    def get_text(self, length):
+        return ' '.join(self.random.choices(self.words, k=length))
+
+    def create_recipes(self, count, matching=False):
+        batch_size = 5000
+        for start in range(0, max(count, 0), batch_size):
+            models.Recipe.objects.bulk_create(
+                models.Recipe(
+                    author=self.author,
+                    name=self.get_text(3),
+                    text=' '.join(filter(None, (
+                        self.get_text(30),
+                        self.search_term if matching else '',
+                    ))),
+                    image='recipes/benchmark.png',
+                    cooking_time=self.random.randint(1, 120),
+                )
+                for _ in range(min(batch_size, count - start))
+            )
+
+    @staticmethod
+    def analyze():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'ANALYZE {models.Recipe._meta.db_table}')
+
+    def measure(self, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(filters.search_recipes(
+                models.Recipe.objects,
+                self.search_term
+            )[:10])
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodgram import pantry, similarity
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the table of similar recipes from ingredient sets'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        index = similarity.SimilarityIndex(pantry.PantryMatrix.build())
+        count = similarity.rebuild(index)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt similar recipes of {count} recipes '
+            f'in {time.monotonic() - started:.1f}s'))
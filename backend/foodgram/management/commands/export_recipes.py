@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+
+from foodgram import models, ndjson
+
+
+class Command(BaseCommand):
+    help = 'Export recipes as newline delimited JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Output file, "-" for stdout')
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Number of recipes fetched per query')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        progress = ndjson.Progress(
+            self.stderr.write if options['verbosity'] > 1 else None)
+        recipes = (
+            models.Recipe.objects
+            .select_related('author')
+            .prefetch_related(Prefetch(
+                'ingredients',
+                queryset=(
+                    models.RecipeIngredient.objects
+                    .select_related('ingredient')
+                    .order_by('pk')
+                )
+            ))
+            .order_by('pk')
+            .iterator(chunk_size=batch_size)
+        )
+
+        with ndjson.open_stream(options['path'], 'w') as stream:
+            lines = []
+            for recipe in recipes:
+                lines.append(ndjson.dumps(self.dump_recipe(recipe)))
+                if len(lines) >= batch_size:
+                    stream.write('\n'.join(lines) + '\n')
+                    progress.add(len(lines))
+                    lines = []
+            if lines:
+                stream.write('\n'.join(lines) + '\n')
+                progress.add(len(lines))
+
+        self.stderr.write(self.style.SUCCESS(
+            f'Exported {progress.summary()}'))
+
+    @staticmethod
+    def dump_recipe(recipe):
+        return {
+            'id': recipe.pk,
+            'author': recipe.author.username,
+            'name': recipe.name,
+            'image': recipe.image.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'date_posted': recipe.date_posted.isoformat(),
+            'ingredients': [
+                {
+                    'name': recipe_ingredient.ingredient.name,
+                    'measurement_unit': (
+                        recipe_ingredient.ingredient.measurement_unit),
+                    'amount': recipe_ingredient.amount,
+                }
+                for recipe_ingredient in recipe.ingredients.all()
+            ],
+        }
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from foodgram import images
+
+
+class Command(BaseCommand):
+    help = 'Generate resized variants of recipe images and avatars'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Regenerate variants that are already up to date')
+
+    def handle(self, *args, **options):
+        for model, (field_name, _) in images.IMAGE_FIELDS.items():
+            pks = (
+                model.objects
+                .exclude(**{field_name: ''})
+                .values_list('pk', flat=True)
+                .order_by('pk')
+            )
+            processed = failed = 0
+            for pk in pks.iterator(chunk_size=500):
+                try:
+                    images.process_instance(model, pk, force=options['force'])
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(
+                        f'{model._meta.model_name} {pk}: {error}')
+                else:
+                    processed += 1
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: '
+                f'{processed} processed, {failed} failed'))
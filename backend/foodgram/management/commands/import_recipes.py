@@ -0,0 +1,165 @@
+import json
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from foodgram import (
+    counters, feed, invalidation, models, ndjson, similarity
+)
+
+
+class Command(BaseCommand):
+    help = 'Import recipes from newline delimited JSON'
+    max_cached_authors = 100000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Input file, "-" for stdin')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of recipes inserted per transaction')
+
+    def handle(self, *args, **options):
+        self.ingredients = {
+            (name, unit): pk
+            for pk, name, unit in models.Ingredient.objects.values_list(
+                'pk', 'name', 'measurement_unit')
+        }
+        self.authors = {}
+        progress = ndjson.Progress(
+            self.stderr.write if options['verbosity'] > 1 else None)
+        skipped = 0
+        imported = 0
+        # Past BATCH_SIZE recipes all neighbours are rebuilt, so only the
+        # ids of smaller imports are kept
+        refresh_ids = []
+
+        with ndjson.open_stream(options['path'], 'r') as stream:
+            for batch in ndjson.iter_batches(stream, options['batch_size']):
+                recipes = []
+                for number, line in batch:
+                    try:
+                        recipes.append(
+                            (number, *self.parse_recipe(json.loads(line))))
+                    except (ValueError, TypeError, KeyError) as error:
+                        skipped += 1
+                        self.stderr.write(f'line {number}: {error!r}')
+                self.resolve_authors(recipes)
+
+                valid = []
+                for number, recipe, date_posted, ingredients in recipes:
+                    if recipe.author_id is None:
+                        skipped += 1
+                        self.stderr.write(
+                            f'line {number}: unknown author '
+                            f'{recipe.author_name!r}')
+                    else:
+                        valid.append((recipe, date_posted, ingredients))
+                with transaction.atomic():
+                    recipe_ids = self.save_recipes(valid)
+                imported += len(recipe_ids)
+                if imported > similarity.BATCH_SIZE:
+                    refresh_ids.clear()
+                else:
+                    refresh_ids.extend(recipe_ids)
+                progress.add(len(valid))
+
+        if imported > similarity.BATCH_SIZE:
+            similarity.rebuild()
+        elif refresh_ids:
+            similarity.refresh(refresh_ids)
+        self.stderr.write(self.style.SUCCESS(
+            f'Imported {progress.summary()}, skipped {skipped}'))
+
+    @staticmethod
+    def check_amount(value, name):
+        if (
+            not isinstance(value, int)
+            or not models.MIN_AMOUNT_VALUE <= value <= models.MAX_AMOUNT_VALUE
+        ):
+            raise ValueError(f'invalid {name} {value!r}')
+        return value
+
+    def parse_recipe(self, data):
+        recipe = models.Recipe(
+            name=str(data['name']),
+            image=str(data['image']),
+            text=str(data['text']),
+            cooking_time=self.check_amount(
+                data['cooking_time'], 'cooking_time'),
+        )
+        recipe.author_name = str(data['author'])
+        recipe.author_id = None
+
+        date_posted = data.get('date_posted')
+        if date_posted is not None:
+            date_posted = parse_datetime(date_posted)
+            if date_posted is None:
+                raise ValueError('invalid date_posted')
+
+        ingredients = {}
+        for item in data['ingredients']:
+            key = (item['name'], item['measurement_unit'])
+            if key not in self.ingredients:
+                raise ValueError(f'unknown ingredient {key!r}')
+            ingredient_id = self.ingredients[key]
+            if ingredient_id in ingredients:
+                raise ValueError(f'duplicate ingredient {key!r}')
+            ingredients[ingredient_id] = self.check_amount(
+                item['amount'], 'amount')
+        if not ingredients:
+            raise ValueError('no ingredients')
+        return recipe, date_posted, ingredients
+
+    def resolve_authors(self, recipes):
+        unknown = {
+            recipe.author_name
+            for _, recipe, _, _ in recipes
+            if recipe.author_name not in self.authors
+        }
+        if unknown:
+            if len(self.authors) + len(unknown) > self.max_cached_authors:
+                self.authors.clear()
+            self.authors.update(dict.fromkeys(unknown))
+            self.authors.update(
+                models.User.objects
+                .filter(username__in=unknown)
+                .values_list('username', 'pk'))
+        for _, recipe, _, _ in recipes:
+            recipe.author_id = self.authors[recipe.author_name]
+
+    @staticmethod
+    def save_recipes(recipes):
+        if not recipes:
+            return []
+        models.Recipe.objects.bulk_create(
+            [recipe for recipe, _, _ in recipes])
+
+        # auto_now_add overrides the date on insert
+        dated = []
+        for recipe, date_posted, _ in recipes:
+            if date_posted is not None:
+                recipe.date_posted = date_posted
+                dated.append(recipe)
+        if dated:
+            models.Recipe.objects.bulk_update(dated, ['date_posted'])
+
+        models.RecipeIngredient.objects.bulk_create([
+            models.RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount)
+            for recipe, _, ingredients in recipes
+            for ingredient_id, amount in ingredients.items()
+        ])
+        recipe_ids = [recipe.pk for recipe, _, _ in recipes]
+        feed.fan_out(recipe_ids)
+        authors = Counter(recipe.author_id for recipe, _, _ in recipes)
+        for author_id, count in authors.items():
+            counters.increment(counters.RECIPES, author_id, count)
+        # New recipes are in no shopping cart yet, and neighbours are
+        # refreshed once after the whole stream
+        invalidation.recipes_changed(
+            recipe_ids, shopping_lists=False, similar=False)
+        return recipe_ids
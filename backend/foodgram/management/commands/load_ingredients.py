@@ -0,0 +1,105 @@
+import csv
+import io
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from foodgram import caching, models
+
+
+class Command(BaseCommand):
+    help = 'Load or refresh the ingredient catalog from a CSV or JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the CSV or JSON dataset')
+        parser.add_argument(
+            '--format', choices=('csv', 'json'),
+            help='Dataset format, detected from the extension by default')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        data_format = options['format'] or path.suffix.lstrip('.').lower()
+        if data_format not in ('csv', 'json'):
+            raise CommandError(f'Unsupported dataset format: {path.suffix}')
+        if not path.exists():
+            raise CommandError(f'{path} does not exist')
+
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                inserted, total = self.load_postgresql(path, data_format)
+            else:
+                inserted, total = self.load_generic(path, data_format)
+            if inserted:
+                caching.bump_version(caching.INGREDIENTS_VERSION)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{inserted} inserted, {total - inserted} unchanged'))
+
+    @staticmethod
+    def read_rows(path, data_format):
+        with open(path, encoding='utf-8', newline='') as file:
+            if data_format == 'csv':
+                rows = [tuple(row) for row in csv.reader(file) if row]
+            else:
+                rows = [
+                    (item['name'], item['measurement_unit'])
+                    for item in json.load(file)
+                ]
+        for row in rows:
+            if len(row) != 2:
+                raise CommandError(f'Invalid row: {row!r}')
+        return {(name.strip(), unit.strip()) for name, unit in rows}
+
+    def load_generic(self, path, data_format):
+        rows = self.read_rows(path, data_format)
+        existing = set(models.Ingredient.objects.values_list(
+            'name', 'measurement_unit'))
+        new_rows = sorted(rows - existing)
+        models.Ingredient.objects.bulk_create(
+            [
+                models.Ingredient(name=name, measurement_unit=unit)
+                for name, unit in new_rows
+            ],
+            batch_size=1000)
+        return len(new_rows), len(rows)
+
+    def load_postgresql(self, path, data_format):
+        table = models.Ingredient._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_staging '
+                '(name text, measurement_unit text) ON COMMIT DROP')
+
+            copy_sql = (
+                'COPY ingredient_staging (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)')
+            if data_format == 'csv':
+                with open(path, encoding='utf-8', newline='') as file:
+                    cursor.copy_expert(copy_sql, file)
+            else:
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(
+                    self.read_rows(path, data_format))
+                buffer.seek(0)
+                cursor.copy_expert(copy_sql, buffer)
+
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_upsert ON COMMIT DROP AS '
+                'SELECT DISTINCT btrim(name) AS name, '
+                'btrim(measurement_unit) AS measurement_unit '
+                'FROM ingredient_staging')
+            cursor.execute((
+                'WITH inserted AS ('
+                'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT name, measurement_unit FROM ingredient_upsert '
+                'ORDER BY name '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING '
+                'RETURNING 1) '
+                'SELECT (SELECT count(*) FROM inserted), '
+                '(SELECT count(*) FROM ingredient_upsert)'
+            ).format(table=table))
+            inserted, total = cursor.fetchone()
+            cursor.execute('DROP TABLE ingredient_staging, ingredient_upsert')
+        return inserted, total
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodgram import images
+
+
+class Command(BaseCommand):
+    help = 'Move existing images into the content addressed storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-old', action='store_true',
+            help='Do not delete the original files')
+
+    def handle(self, *args, **options):
+        for model, (field_name, variants_name) in images.IMAGE_FIELDS.items():
+            storage = model._meta.get_field(field_name).storage
+            rows = (
+                model.objects
+                .exclude(**{field_name: ''})
+                .exclude(**{f'{field_name}__isnull': True})
+                .values_list('pk', field_name, variants_name)
+                .order_by('pk')
+            )
+            moved = missing = 0
+            for pk, old_name, variants in rows.iterator(chunk_size=500):
+                if storage.is_content_name(old_name):
+                    continue
+                if not storage.exists(old_name):
+                    missing += 1
+                    self.stderr.write(
+                        f'{model._meta.model_name} {pk}: '
+                        f'{old_name} not found')
+                    continue
+
+                with storage.open(old_name) as file:
+                    new_name = storage.save(old_name, file)
+                with transaction.atomic():
+                    instance = model.objects.select_for_update().get(pk=pk)
+                    if getattr(instance, field_name).name != old_name:
+                        continue
+                    model.objects.filter(pk=pk).update(
+                        **{field_name: new_name})
+                    images.invalidate(instance)
+
+                moved += 1
+                images.process_instance(model, pk)
+                if not options['keep_old']:
+                    self.delete_old_files(storage, old_name, variants)
+
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: '
+                f'{moved} moved, {missing} missing'))
+
+    @staticmethod
+    def delete_old_files(storage, name, variants):
+        names = [name]
+        for files in variants.values():
+            if isinstance(files, dict):
+                names.extend(files.values())
+        for name in names:
+            # Content addressed files may be shared with other rows
+            if not storage.is_content_name(name):
+                storage.delete(name)
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from foodgram import shopping_list
+
+
+class Command(BaseCommand):
+    help = 'Verify and rebuild the aggregated shopping lists of users'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report drift, exit with an error if any is found')
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Rebuild every shopping list instead of drifted ones')
+
+    def handle(self, *args, **options):
+        drift = shopping_list.get_drift()
+        for (user_id, ingredient_id), (expected, actual) in sorted(
+            drift.items()
+        ):
+            self.stdout.write(
+                f'user {user_id}, ingredient {ingredient_id}: '
+                f'expected {expected}, stored {actual}')
+
+        if options['check']:
+            if drift:
+                raise CommandError(f'{len(drift)} drifted rows found')
+            self.stdout.write(self.style.SUCCESS('No drift found'))
+            return
+
+        user_ids = None
+        if not options['all']:
+            user_ids = {user_id for user_id, _ in drift}
+        with transaction.atomic():
+            shopping_list.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(
+            'Rebuilt all shopping lists' if user_ids is None
+            else f'Rebuilt {len(user_ids)} shopping lists'))
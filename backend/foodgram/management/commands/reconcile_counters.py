@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from foodgram import counters
+
+
+class Command(BaseCommand):
+    help = 'Verify and fix the denormalized popularity counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report drift, exit with an error if any is found')
+
+    def handle(self, *args, **options):
+        drift = {}
+        for counter in counters.COUNTERS:
+            rows = counters.get_drift(counter)
+            for pk, expected, actual in rows:
+                self.stdout.write(
+                    f'{counter.target._meta.model_name} {pk}, '
+                    f'{counter.field}: expected {expected}, stored {actual}')
+            if rows:
+                drift[counter] = [pk for pk, _, _ in rows]
+
+        if options['check']:
+            if drift:
+                total = sum(len(pks) for pks in drift.values())
+                raise CommandError(f'{total} drifted counters found')
+            self.stdout.write(self.style.SUCCESS('No drift found'))
+            return
+
+        with transaction.atomic():
+            fixed = sum(
+                counters.reconcile(counter, pks)
+                for counter, pks in drift.items())
+        self.stdout.write(self.style.SUCCESS(f'Fixed {fixed} counters'))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0006_change_ordering_and_validators'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-date_posted', '-id'], name='recipe_date_posted_id_idx'),
+        ),
+    ]
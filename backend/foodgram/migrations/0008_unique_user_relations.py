@@ -0,0 +1,52 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:25
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Min
+
+
+def remove_duplicates(apps, schema_editor):
+    relations = (
+        ('Favorite', 'recipe'),
+        ('ShoppingCartItem', 'recipe'),
+        ('Subscription', 'subscribed_to'),
+    )
+    for model_name, target in relations:
+        model = apps.get_model('foodgram', model_name)
+        keep_ids = (
+            model.objects
+            .values('user', target)
+            .annotate(keep_id=Min('id'))
+            .values('keep_id')
+        )
+        model.objects.exclude(id__in=keep_ids).delete()
+    apps.get_model('foodgram', 'Subscription').objects.filter(
+        user=F('subscribed_to')).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0007_recipe_date_posted_id_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcartitem',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shopping_cart_item'),
+        ),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(fields=('user', 'subscribed_to'), name='unique_subscription'),
+        ),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.CheckConstraint(condition=models.Q(('user', models.F('subscribed_to')), _negated=True), name='prevent_self_subscription'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def fill_shopping_lists(apps, schema_editor):
+    ShoppingCartItem = apps.get_model('foodgram', 'ShoppingCartItem')
+    ShoppingListIngredient = apps.get_model(
+        'foodgram', 'ShoppingListIngredient')
+    totals = (
+        ShoppingCartItem.objects
+        .filter(recipe__ingredients__isnull=False)
+        .values_list('user_id', 'recipe__ingredients__ingredient_id')
+        .annotate(total=Sum('recipe__ingredients__amount'))
+        .order_by()
+    )
+    ShoppingListIngredient.objects.bulk_create(
+        (
+            ShoppingListIngredient(
+                user_id=user_id, ingredient_id=ingredient_id,
+                total_amount=total)
+            for user_id, ingredient_id, total in totals.iterator()
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0008_unique_user_relations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.IntegerField(verbose_name='Общее количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_lists', to='foodgram.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'ингредиент списка покупок',
+                'verbose_name_plural': 'Списки покупок',
+                'ordering': ['user__id', 'ingredient__name'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_list_ingredient')],
+            },
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:32
+
+import foodgram.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0010_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, storage=foodgram.storage.get_content_storage, upload_to='users/', verbose_name='Аватар'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=foodgram.storage.get_content_storage, upload_to='recipes/', verbose_name='Изображение'),
+        ),
+    ]
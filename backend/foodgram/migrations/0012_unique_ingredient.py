@@ -0,0 +1,63 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:37
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_rows(model, owner, keep_id, duplicate_ids, amount_field):
+    for row in model.objects.filter(ingredient_id__in=duplicate_ids):
+        kept = model.objects.filter(
+            **{owner: getattr(row, f'{owner}_id')}, ingredient_id=keep_id
+        ).first()
+        if kept is None:
+            row.ingredient_id = keep_id
+            row.save()
+        else:
+            setattr(kept, amount_field, (
+                getattr(kept, amount_field) + getattr(row, amount_field)))
+            kept.save()
+            row.delete()
+
+
+def merge_duplicates(apps, schema_editor):
+    Ingredient = apps.get_model('foodgram', 'Ingredient')
+    RecipeIngredient = apps.get_model('foodgram', 'RecipeIngredient')
+    ShoppingListIngredient = apps.get_model(
+        'foodgram', 'ShoppingListIngredient')
+    duplicates = (
+        Ingredient.objects
+        .values('name', 'measurement_unit')
+        .annotate(keep_id=Min('id'), ingredients=Count('id'))
+        .filter(ingredients__gt=1)
+    )
+    for group in duplicates:
+        duplicate_ids = list(
+            Ingredient.objects
+            .filter(
+                name=group['name'],
+                measurement_unit=group['measurement_unit'])
+            .exclude(id=group['keep_id'])
+            .values_list('id', flat=True)
+        )
+        merge_rows(
+            RecipeIngredient, 'recipe',
+            group['keep_id'], duplicate_ids, 'amount')
+        merge_rows(
+            ShoppingListIngredient, 'user',
+            group['keep_id'], duplicate_ids, 'total_amount')
+        Ingredient.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0011_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BACKFILL_LIMIT = 100
+
+
+def fill_feeds(apps, schema_editor):
+    Subscription = apps.get_model('foodgram', 'Subscription')
+    Recipe = apps.get_model('foodgram', 'Recipe')
+    FeedEntry = apps.get_model('foodgram', 'FeedEntry')
+    for user_id, author_id in Subscription.objects.values_list(
+        'user_id', 'subscribed_to_id'
+    ).iterator():
+        recipes = (
+            Recipe.objects
+            .filter(author_id=author_id)
+            .order_by('-date_posted', '-id')
+            .values_list('id', 'date_posted')[:BACKFILL_LIMIT]
+        )
+        FeedEntry.objects.bulk_create([
+            FeedEntry(
+                user_id=user_id, recipe_id=recipe_id,
+                author_id=author_id, date_posted=date_posted)
+            for recipe_id, date_posted in recipes
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0012_unique_ingredient'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_posted', models.DateTimeField(verbose_name='Время публикации')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='foodgram.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'запись ленты',
+                'verbose_name_plural': 'Ленты',
+                'ordering': ['user__id', '-date_posted', '-recipe__id'],
+                'indexes': [models.Index(fields=['user', '-date_posted', '-recipe'], name='feed_user_date_posted_idx'), models.Index(fields=['user', 'author'], name='feed_user_author_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'recipe'), name='unique_feed_entry')],
+            },
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:41
+
+from django.db import migrations
+
+INGREDIENT_IDS_SQL = (
+    "coalesce((SELECT array_agg(ri.ingredient_id ORDER BY ri.ingredient_id) "
+    "FROM foodgram_recipeingredient ri WHERE ri.recipe_id = r.id), '{}')"
+)
+TRIGGERS = (
+    ('insert', 'INSERT', 'NEW TABLE'),
+    ('update', 'UPDATE', 'NEW TABLE'),
+    ('delete', 'DELETE', 'OLD TABLE'),
+)
+
+
+def create_ingredient_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "ALTER TABLE foodgram_recipe "
+        "ADD COLUMN ingredient_ids integer[] NOT NULL DEFAULT '{}'")
+    schema_editor.execute(
+        'UPDATE foodgram_recipe r SET ingredient_ids = ' + INGREDIENT_IDS_SQL)
+    schema_editor.execute(
+        'CREATE INDEX recipe_ingredient_ids_idx '
+        'ON foodgram_recipe USING gin (ingredient_ids)')
+    schema_editor.execute(
+        'CREATE FUNCTION foodgram_recipe_ingredient_ids() RETURNS trigger AS '
+        '$$ BEGIN '
+        'UPDATE foodgram_recipe r SET ingredient_ids = ' + INGREDIENT_IDS_SQL
+        + ' WHERE r.id IN (SELECT recipe_id FROM changed_rows); '
+        'RETURN NULL; END $$ LANGUAGE plpgsql')
+    for name, event, table in TRIGGERS:
+        schema_editor.execute(
+            f'CREATE TRIGGER foodgram_recipe_ingredient_ids_{name} '
+            f'AFTER {event} ON foodgram_recipeingredient '
+            f'REFERENCING {table} AS changed_rows FOR EACH STATEMENT '
+            f'EXECUTE FUNCTION foodgram_recipe_ingredient_ids()')
+
+
+def drop_ingredient_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGGERS:
+        schema_editor.execute(
+            f'DROP TRIGGER IF EXISTS foodgram_recipe_ingredient_ids_{name} '
+            f'ON foodgram_recipeingredient')
+    schema_editor.execute(
+        'DROP FUNCTION IF EXISTS foodgram_recipe_ingredient_ids()')
+    schema_editor.execute(
+        'ALTER TABLE foodgram_recipe DROP COLUMN IF EXISTS ingredient_ids')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0014_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_ingredient_index, drop_ingredient_index),
+    ]
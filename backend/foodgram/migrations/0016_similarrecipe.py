@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0015_recipe_ingredient_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarRecipe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar', to='foodgram.recipe', verbose_name='Рецепт')),
+                ('similar_to', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='foodgram.recipe', verbose_name='Похожий рецепт')),
+            ],
+            options={
+                'verbose_name': 'похожий рецепт',
+                'verbose_name_plural': 'Похожие рецепты',
+                'ordering': ['recipe__id', '-score', '-similar_to__id'],
+                'indexes': [models.Index(fields=['recipe', '-score', '-similar_to'], name='similar_recipe_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('recipe', 'similar_to'), name='unique_similar_recipe')],
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('Favorite', 'recipe', 'Recipe', 'pk', 'favorites_count'),
+    ('ShoppingCartItem', 'recipe', 'Recipe', 'pk', 'in_carts_count'),
+    ('Subscription', 'subscribed_to', 'Profile', 'user', 'subscribers_count'),
+    ('Recipe', 'author', 'Profile', 'user', 'recipes_count'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for model_name, link, target_name, target_link, field in COUNTERS:
+        model = apps.get_model('foodgram', model_name)
+        target = apps.get_model('foodgram', target_name)
+        target.objects.update(**{field: Coalesce(
+            Subquery(
+                model.objects
+                .filter(**{link: OuterRef(target_link)})
+                .order_by()
+                .values(link)
+                .annotate(count=Count('pk'))
+                .values('count'),
+                output_field=IntegerField()),
+            0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0016_similarrecipe'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Кол-во рецептов'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='subscribers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Кол-во подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Кол-во добавлений в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Кол-во добавлений в корзину'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-date_posted', '-id'], name='recipe_favorites_count_idx'),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.2.3 on 2026-10-18 21:05
+
+from django.db import migrations
+
+INGREDIENT_IDS_SQL = (
+    "coalesce((SELECT array_agg(ri.ingredient_id ORDER BY ri.ingredient_id) "
+    "FROM foodgram_recipeingredient ri WHERE ri.recipe_id = r.id), '{}')"
+)
+# A row moved to another recipe changes the ingredients of both recipes
+TRIGGERS = (
+    ('insert', 'INSERT', 'NEW TABLE AS new_rows'),
+    ('update', 'UPDATE', 'OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+    ('delete', 'DELETE', 'OLD TABLE AS old_rows'),
+)
+OLD_TRIGGERS = (
+    ('insert', 'INSERT', 'NEW TABLE AS changed_rows'),
+    ('update', 'UPDATE', 'NEW TABLE AS changed_rows'),
+    ('delete', 'DELETE', 'OLD TABLE AS changed_rows'),
+)
+
+
+def get_update_sql(rows):
+    return (
+        'UPDATE foodgram_recipe r SET ingredient_ids = ' + INGREDIENT_IDS_SQL
+        + f' WHERE r.id IN ({rows}); ')
+
+
+FUNCTION_SQL = (
+    'CREATE FUNCTION foodgram_recipe_ingredient_ids() RETURNS trigger AS '
+    "$$ BEGIN IF TG_OP = 'INSERT' THEN "
+    + get_update_sql('SELECT recipe_id FROM new_rows')
+    + "ELSIF TG_OP = 'DELETE' THEN "
+    + get_update_sql('SELECT recipe_id FROM old_rows')
+    + 'ELSE '
+    + get_update_sql(
+        'SELECT recipe_id FROM old_rows UNION SELECT recipe_id FROM new_rows')
+    + 'END IF; RETURN NULL; END $$ LANGUAGE plpgsql'
+)
+OLD_FUNCTION_SQL = (
+    'CREATE FUNCTION foodgram_recipe_ingredient_ids() RETURNS trigger AS '
+    '$$ BEGIN '
+    + get_update_sql('SELECT recipe_id FROM changed_rows')
+    + 'RETURN NULL; END $$ LANGUAGE plpgsql'
+)
+
+
+def replace_triggers(schema_editor, array_type, function_sql, triggers):
+    for name, _, _ in triggers:
+        schema_editor.execute(
+            f'DROP TRIGGER IF EXISTS foodgram_recipe_ingredient_ids_{name} '
+            f'ON foodgram_recipeingredient')
+    schema_editor.execute(
+        'DROP FUNCTION IF EXISTS foodgram_recipe_ingredient_ids()')
+    # Ingredient ids are bigint, an integer[] column overflows at 2^31
+    schema_editor.execute(
+        'ALTER TABLE foodgram_recipe ALTER COLUMN ingredient_ids '
+        f"DROP DEFAULT, ALTER COLUMN ingredient_ids TYPE {array_type}, "
+        "ALTER COLUMN ingredient_ids SET DEFAULT '{}'")
+    schema_editor.execute(function_sql)
+    for name, event, tables in triggers:
+        schema_editor.execute(
+            f'CREATE TRIGGER foodgram_recipe_ingredient_ids_{name} '
+            f'AFTER {event} ON foodgram_recipeingredient '
+            f'REFERENCING {tables} FOR EACH STATEMENT '
+            f'EXECUTE FUNCTION foodgram_recipe_ingredient_ids()')
+
+
+def use_bigint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    replace_triggers(schema_editor, 'bigint[]', FUNCTION_SQL, TRIGGERS)
+    # Recipes left stale by rows moved before this migration
+    schema_editor.execute(
+        'UPDATE foodgram_recipe r SET ingredient_ids = ' + INGREDIENT_IDS_SQL)
+
+
+def use_integer(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    replace_triggers(
+        schema_editor, 'integer[]', OLD_FUNCTION_SQL, OLD_TRIGGERS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0017_popularity_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(use_bigint, use_integer),
+    ]
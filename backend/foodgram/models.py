@@ -1,8 +1,11 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import connection, models
 from django.dispatch import receiver
 
+from .storage import get_content_storage
+
 
 MIN_AMOUNT_VALUE = 1
 MAX_AMOUNT_VALUE = 32000
@@ -12,13 +15,41 @@ User = get_user_model()
 User._meta.ordering = ['id']
 
 
-class Profile(models.Model):
+class CounterFieldsMixin:
+    # Counters only change through F() updates in foodgram.counters, an
+    # ordinary save of a loaded instance would write back stale values
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            skipped = self.get_deferred_fields() | set(self.counter_fields)
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+            ]
+        super().save(*args, **kwargs)
+
+
+class Profile(CounterFieldsMixin, models.Model):
     user = models.OneToOneField(
         User, on_delete=models.CASCADE,
         related_name='profile', verbose_name='Пользователь')
 
     avatar = models.ImageField(
-        upload_to='users/', null=True, blank=True, verbose_name='Аватар')
+        upload_to='users/', storage=get_content_storage,
+        null=True, blank=True, verbose_name='Аватар')
+
+    avatar_variants = models.JSONField(
+        default=dict, blank=True, editable=False,
+        verbose_name='Варианты аватара')
+
+    subscribers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Кол-во подписчиков')
+
+    recipes_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Кол-во рецептов')
+
+    counter_fields = ('subscribers_count', 'recipes_count')
 
     class Meta:
         verbose_name = 'профиль'
@@ -35,6 +66,62 @@ def create_profile(sender, instance, created, **kwargs):
         Profile.objects.create(user=instance)
 
 
+class UserRelationQuerySet(models.QuerySet):
+    def get_relation_sql(self, target_name):
+        meta = self.model._meta
+        target_field = meta.get_field(target_name)
+        target_meta = target_field.related_model._meta
+        quote = connection.ops.quote_name
+        return {
+            'table': quote(meta.db_table),
+            'pk': quote(meta.pk.column),
+            'user': quote(meta.get_field('user').column),
+            'target': quote(target_field.column),
+            'target_table': quote(target_meta.db_table),
+            'target_pk': quote(target_meta.pk.column),
+        }
+
+    def create_unique(self, user, **target):
+        (target_name, target_id), = target.items()
+        sql = self.get_relation_sql(target_name)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {table} ({user}, {target}) '
+                'SELECT %s, {target_pk} FROM {target_table} '
+                'WHERE {target_pk} = %s '
+                'ON CONFLICT DO NOTHING RETURNING {pk}'.format(**sql),
+                [user.pk, target_id])
+            row = cursor.fetchone()
+        if row is None:
+            return None
+
+        instance = self.model(
+            pk=row[0], user=user, **{f'{target_name}_id': target_id})
+        models.signals.post_save.send(
+            sender=self.model, instance=instance, created=True,
+            update_fields=None, raw=False, using=self.db)
+        return instance
+
+    def delete_unique(self, user, **target):
+        (target_name, target_id), = target.items()
+        sql = self.get_relation_sql(target_name)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM {table} WHERE {user} = %s AND {target} = %s '
+                'RETURNING {pk}'.format(**sql),
+                [user.pk, target_id])
+            row = cursor.fetchone()
+        if row is None:
+            return None
+
+        instance = self.model(
+            pk=row[0], user=user, **{f'{target_name}_id': target_id})
+        models.signals.post_delete.send(
+            sender=self.model, instance=instance,
+            using=self.db, origin=instance)
+        return instance
+
+
 class Subscription(models.Model):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE,
@@ -44,10 +131,20 @@ class Subscription(models.Model):
         User, on_delete=models.CASCADE,
         related_name='subscribers', verbose_name='Подписан на')
 
+    objects = UserRelationQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'подписка'
         verbose_name_plural = 'Подписки'
         ordering = ['user__id', 'subscribed_to__id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'subscribed_to'],
+                name='unique_subscription'),
+            models.CheckConstraint(
+                condition=~models.Q(user=models.F('subscribed_to')),
+                name='prevent_self_subscription'),
+        ]
 
     def __str__(self):
         user1 = self.user.username
@@ -66,12 +163,24 @@ class Ingredient(models.Model):
         verbose_name = 'ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient'),
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeManager(models.Manager):
+    # The search vector is only used inside SQL, loading it into every
+    # instance would just copy the tsvector over the wire
+    def get_queryset(self):
+        return super().get_queryset().defer('search_vector')
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     author = models.ForeignKey(
         User, on_delete=models.CASCADE,
         related_name='recipes', verbose_name='Автор')
@@ -80,7 +189,12 @@ class Recipe(models.Model):
         max_length=256, verbose_name='Название')
 
     image = models.ImageField(
-        upload_to='recipes/', verbose_name='Изображение')
+        upload_to='recipes/', storage=get_content_storage,
+        verbose_name='Изображение')
+
+    image_variants = models.JSONField(
+        default=dict, blank=True, editable=False,
+        verbose_name='Варианты изображения')
 
     cooking_time = models.PositiveSmallIntegerField(
         validators=[
@@ -95,10 +209,33 @@ class Recipe(models.Model):
     date_posted = models.DateTimeField(
         auto_now_add=True, verbose_name='Время публикации')
 
+    # Maintained by a database trigger on PostgreSQL
+    search_vector = SearchVectorField(
+        null=True, editable=False, verbose_name='Поисковый вектор')
+
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False,
+        verbose_name='Кол-во добавлений в избранное')
+
+    in_carts_count = models.PositiveIntegerField(
+        default=0, editable=False,
+        verbose_name='Кол-во добавлений в корзину')
+
+    objects = RecipeManager()
+    counter_fields = ('favorites_count', 'in_carts_count')
+
     class Meta:
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-date_posted']
+        indexes = [
+            models.Index(
+                fields=['-date_posted', '-id'],
+                name='recipe_date_posted_id_idx'),
+            models.Index(
+                fields=['-favorites_count', '-date_posted', '-id'],
+                name='recipe_favorites_count_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -138,10 +275,17 @@ class ShoppingCartItem(models.Model):
         Recipe, on_delete=models.CASCADE,
         related_name='in_shopping_carts', verbose_name='Рецепт')
 
+    objects = UserRelationQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'предмет корзины'
         verbose_name_plural = 'Предметы корзин'
         ordering = ['user__id', '-recipe__date_posted']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_shopping_cart_item'),
+        ]
 
     def __str__(self):
         return f'Корзина {self.user.username} - {self.recipe.name}'
@@ -156,10 +300,110 @@ class Favorite(models.Model):
         Recipe, on_delete=models.CASCADE,
         related_name='favorites', verbose_name='Рецепт')
 
+    objects = UserRelationQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'избранное'
         verbose_name_plural = 'Избранные'
         ordering = ['user__id', '-recipe__date_posted']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_favorite'),
+        ]
 
     def __str__(self):
         return f'Избранное {self.user.username} - {self.recipe.name}'
+
+
+class ShoppingListIngredient(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='shopping_list', verbose_name='Пользователь')
+
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE,
+        related_name='shopping_lists', verbose_name='Ингредиент')
+
+    total_amount = models.IntegerField(
+        verbose_name='Общее количество')
+
+    class Meta:
+        verbose_name = 'ингредиент списка покупок'
+        verbose_name_plural = 'Списки покупок'
+        ordering = ['user__id', 'ingredient__name']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_ingredient'),
+        ]
+
+    def __str__(self):
+        return f'Список покупок {self.user.username} - {self.ingredient.name}'
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='feed', verbose_name='Пользователь')
+
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE,
+        related_name='feed_entries', verbose_name='Рецепт')
+
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='+', verbose_name='Автор')
+
+    date_posted = models.DateTimeField(
+        verbose_name='Время публикации')
+
+    class Meta:
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'Ленты'
+        ordering = ['user__id', '-date_posted', '-recipe__id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_feed_entry'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-date_posted', '-recipe'],
+                name='feed_user_date_posted_idx'),
+            models.Index(
+                fields=['user', 'author'], name='feed_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'Лента {self.user.username} - {self.recipe.name}'
+
+
+class SimilarRecipe(models.Model):
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE,
+        related_name='similar', verbose_name='Рецепт')
+
+    similar_to = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE,
+        related_name='+', verbose_name='Похожий рецепт')
+
+    score = models.FloatField(
+        verbose_name='Сходство')
+
+    class Meta:
+        verbose_name = 'похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ['recipe__id', '-score', '-similar_to__id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar_to'],
+                name='unique_similar_recipe'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score', '-similar_to'],
+                name='similar_recipe_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe.name} - {self.similar_to.name}'
@@ -0,0 +1,51 @@
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+
+@contextmanager
+def open_stream(path, mode):
+    if path == '-':
+        yield sys.stdin if mode == 'r' else sys.stdout
+        return
+    with open(path, mode, encoding='utf-8') as stream:
+        yield stream
+
+
+def dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def iter_batches(lines, size):
+    batch = []
+    for number, line in enumerate(lines, start=1):
+        if line.strip():
+            batch.append((number, line))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Progress:
+    def __init__(self, write):
+        self.write = write
+        self.started = time.monotonic()
+        self.rows = 0
+
+    @property
+    def rate(self):
+        return self.rows / max(time.monotonic() - self.started, 1e-9)
+
+    def add(self, rows):
+        self.rows += rows
+        if self.write is not None:
+            self.write(f'{self.rows} rows, {self.rate:.0f} rows/s')
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        return (
+            f'{self.rows} rows in {elapsed:.1f}s '
+            f'({self.rate:.0f} rows/s)')
@@ -1,5 +1,209 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import partial
+from hashlib import md5
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from rest_framework import exceptions
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from . import caching
+
+
+class KnownCountPaginator(Paginator):
+    def __init__(self, *args, count, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count = count
 
 
 class PageNumberLimitPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+    count_cache_timeout = 60
+    estimate_count_threshold = 100000
+    uncounted_query_params = ('page', 'limit', 'format')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        count, self.count_exact = self.get_count(queryset, request, view)
+        self.django_paginator_class = partial(KnownCountPaginator, count=count)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.paginator.count,
+            'count_exact': self.count_exact,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_exact'] = {'type': 'boolean'}
+        return response_schema
+
+    def get_count(self, queryset, request, view):
+        if not queryset.query.where:
+            estimate = self.get_estimated_count(queryset)
+            if estimate >= self.estimate_count_threshold:
+                return estimate, False
+
+        version_key = getattr(view, 'count_version_key', None)
+        if version_key is None:
+            return queryset.count(), True
+
+        cache_key = self.get_count_cache_key(request, version_key)
+        count = cache.get(cache_key)
+        if count is None:
+            count = queryset.count()
+            cache.set(cache_key, count, self.count_cache_timeout)
+        return count, True
+
+    def get_count_cache_key(self, request, version_key):
+        params = sorted(
+            (key, value)
+            for key, value in request.query_params.lists()
+            if key not in self.uncounted_query_params
+        )
+        digest = md5(
+            repr((request.path, request.user.pk, params)).encode()
+        ).hexdigest()
+        return f'count:{caching.get_version(version_key)}:{digest}'
+
+    @staticmethod
+    def get_estimated_count(queryset):
+        if connection.vendor != 'postgresql':
+            return -1
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        return int(row[0]) if row else -1
+
+
+class KeysetPagination(PageNumberPagination):
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    unsupported_cursor_message = 'not supported with this ordering'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        # A view without a cursor ordering for the current request orders
+        # by something a position can not be resumed from
+        self.ordering = view.cursor_ordering
+        if self.ordering is None:
+            raise exceptions.ValidationError({
+                self.cursor_query_param: self.unsupported_cursor_message})
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request, queryset.model)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [self.invert(name) for name in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(
+                self.get_position_filter(ordering, position))
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        self.next_position = self.previous_position = None
+        if results and (has_more or reverse):
+            self.next_position = self.get_position(results[-1])
+        if results and (has_more or not reverse) and position is not None:
+            self.previous_position = self.get_position(results[0])
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_link(self.next_position, reverse=False),
+            'previous': self.get_link(self.previous_position, reverse=True),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {
+                    'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    @staticmethod
+    def invert(name):
+        return name[1:] if name.startswith('-') else '-' + name
+
+    @staticmethod
+    def get_position_filter(ordering, position):
+        # The OR chain alone can not bound an index scan, the inclusive
+        # bound on the leading field lets the scan start at the position
+        first = ordering[0]
+        bound = 'lte' if first.startswith('-') else 'gte'
+        position_filter = Q(**{f'{first.lstrip("-")}__{bound}': position[0]})
+        after = Q()
+        equal = {}
+        for name, value in zip(ordering, position):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            after |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return position_filter & after
+
+    def get_position(self, instance):
+        return [
+            getattr(instance, name.lstrip('-'))
+            for name in self.ordering
+        ]
+
+    def get_link(self, position, reverse):
+        if position is None:
+            return None
+        cursor = urlsafe_b64encode(json.dumps({
+            'p': [str(value) for value in position],
+            'r': reverse,
+        }).encode()).decode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, model):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            data = json.loads(urlsafe_b64decode(cursor.encode()))
+            position = [
+                model._meta.get_field(name.lstrip('-')).to_python(value)
+                for name, value in zip(self.ordering, data['p'], strict=True)
+            ]
+            return position, bool(data['r'])
+        except (KeyError, TypeError, ValueError, ValidationError):
+            raise exceptions.NotFound(self.invalid_cursor_message)
+
+
+class PageNumberOrKeysetPagination(PageNumberLimitPagination):
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,169 @@
+import time
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+
+from . import models
+
+
+SEQUENCE_KEY = 'pantry-sequence'
+FULL_REBUILD = 'all'
+MAX_CHANGES = 1000
+MAX_AGE = 15 * 60
+MAX_PANTRY_SIZE = 1000
+# Largest ingredient id looked up through a dense table, sparse larger
+# ids fall back to a sorted search
+MAX_LOOKUP_SIZE = 10_000_000
+ROW_DTYPE = np.dtype([
+    ('recipe', np.int64), ('ingredient', np.int64), ('amount', np.int32)])
+
+
+def get_change_key(sequence):
+    return f'pantry-change:{sequence}'
+
+
+def get_sequence():
+    # Start from the clock so a flushed cache never repeats a sequence
+    # number a worker's matrix was built at
+    cache.add(SEQUENCE_KEY, time.time_ns(), None)
+    return cache.get(SEQUENCE_KEY)
+
+
+def record_change(recipe_ids=None):
+    change = FULL_REBUILD if recipe_ids is None else sorted(set(recipe_ids))
+
+    def record():
+        get_sequence()
+        try:
+            sequence = cache.incr(SEQUENCE_KEY)
+        except ValueError:
+            return
+        cache.set(get_change_key(sequence), change, MAX_AGE)
+
+    # Like caching.bump_version, record right away and once committed
+    record()
+    transaction.on_commit(record)
+
+
+class PantryMatrix:
+    # Recipe x ingredient matrix in CSR form: the ingredients of
+    # recipe_ids[i] are indices[indptr[i]:indptr[i + 1]]
+    def __init__(self, recipe_ids, counts, indices, amounts, sequence):
+        self.recipe_ids = recipe_ids
+        self.counts = counts
+        self.indices = indices
+        self.amounts = amounts
+        self.indptr = np.concatenate(([0], np.cumsum(counts)))
+        self.rows = np.repeat(np.arange(len(recipe_ids)), counts)
+        self.sequence = sequence
+        self.built_at = time.monotonic()
+
+    @staticmethod
+    def fetch(recipe_ids=None):
+        rows = models.RecipeIngredient.objects.order_by(
+            'recipe_id', 'ingredient_id')
+        if recipe_ids is not None:
+            rows = rows.filter(recipe_id__in=recipe_ids)
+        # Rows are streamed straight into a record array, ingredient ids
+        # stay int64 like the bigint column
+        data = np.fromiter(
+            rows.values_list('recipe_id', 'ingredient_id', 'amount')
+            .iterator(chunk_size=10000),
+            dtype=ROW_DTYPE)
+        recipe_ids, counts = np.unique(data['recipe'], return_counts=True)
+        return (
+            recipe_ids, counts,
+            data['ingredient'].copy(), data['amount'].copy())
+
+    @classmethod
+    def build(cls):
+        sequence = get_sequence()
+        return cls(*cls.fetch(), sequence)
+
+    def updated(self, recipe_ids, sequence):
+        changed = np.fromiter(recipe_ids, dtype=np.int64)
+        keep = ~np.isin(self.recipe_ids, changed)
+        keep_entries = np.repeat(keep, self.counts)
+        new_recipe_ids, new_counts, new_indices, new_amounts = self.fetch(
+            recipe_ids)
+        return type(self)(
+            np.concatenate((self.recipe_ids[keep], new_recipe_ids)),
+            np.concatenate((self.counts[keep], new_counts)),
+            np.concatenate((self.indices[keep_entries], new_indices)),
+            np.concatenate((self.amounts[keep_entries], new_amounts)),
+            sequence)
+
+    def score(self, ingredient_ids, limit):
+        if not len(self.recipe_ids):
+            return []
+        ingredient_ids = np.asarray(ingredient_ids, dtype=np.int64)
+        size = int(self.indices.max()) + 1
+        if size <= MAX_LOOKUP_SIZE:
+            pantry = np.zeros(size, dtype=bool)
+            pantry[ingredient_ids[ingredient_ids < size]] = True
+            available = pantry[self.indices]
+        else:
+            available = np.isin(self.indices, ingredient_ids)
+        matched = np.bincount(
+            self.rows, weights=available, minlength=len(self.recipe_ids))
+        coverage = matched / self.counts
+
+        candidates = np.flatnonzero(matched)
+        if len(candidates) > limit:
+            # Keep everything tied with the limit-th best coverage, the
+            # tie-breakers below decide which of those make the cut
+            threshold = -np.partition(-coverage[candidates], limit - 1)[
+                limit - 1]
+            candidates = candidates[coverage[candidates] >= threshold]
+        # Best coverage first, then fewer missing, then newer recipes
+        candidates = candidates[np.lexsort((
+            -self.recipe_ids[candidates],
+            self.counts[candidates] - matched[candidates],
+            -coverage[candidates],
+        ))][:limit]
+
+        results = []
+        for row in candidates:
+            entries = slice(self.indptr[row], self.indptr[row + 1])
+            missing = ~available[entries]
+            results.append({
+                'recipe_id': int(self.recipe_ids[row]),
+                'coverage': float(coverage[row]),
+                'missing': list(zip(
+                    self.indices[entries][missing].tolist(),
+                    self.amounts[entries][missing].tolist())),
+            })
+        return results
+
+
+_matrix = None
+
+
+def get_matrix():
+    global _matrix
+    sequence = get_sequence()
+    if (
+        _matrix is None
+        or not _matrix.sequence <= sequence <= _matrix.sequence + MAX_CHANGES
+        or time.monotonic() - _matrix.built_at > MAX_AGE
+    ):
+        _matrix = PantryMatrix.build()
+    elif sequence != _matrix.sequence:
+        keys = [
+            get_change_key(number)
+            for number in range(_matrix.sequence + 1, sequence + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys) or FULL_REBUILD in changes.values():
+            _matrix = PantryMatrix.build()
+        else:
+            recipe_ids = set()
+            for change in changes.values():
+                recipe_ids.update(change)
+            _matrix = _matrix.updated(recipe_ids, sequence)
+    return _matrix
+
+
+def match(ingredient_ids, limit):
+    return get_matrix().score(ingredient_ids, limit)
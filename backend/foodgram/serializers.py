@@ -1,28 +1,67 @@
+import json
+
+import filetype
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
 from rest_framework import serializers
+from rest_framework.utils import html
 from drf_extra_fields.fields import Base64ImageField
 from djoser.serializers import (
     UserSerializer as BaseUserSerializer,
     UserCreateSerializer as BaseUserCreateSerializer
 )
+from PIL import Image
+
+from . import (
+    models, filters, images, ingredient_index, invalidation, shopping_list
+)
 
-from . import models
+
+class ImageUploadField(Base64ImageField):
+    # Multipart uploads are checked by their magic bytes only,
+    # without decoding the whole image
+    header_size = 261
+
+    def to_internal_value(self, data):
+        if not isinstance(data, UploadedFile):
+            return super().to_internal_value(data)
+
+        data.seek(0)
+        extension = filetype.guess_extension(data.read(self.header_size))
+        data.seek(0)
+        if extension not in self.ALLOWED_TYPES:
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        # Only the header is parsed, the pixels are decoded later. Pillow
+        # rejects huge headers itself with an Exception subclass
+        try:
+            images.check_size(Image.open(data))
+        except (OSError, ValueError, Image.DecompressionBombError) as error:
+            raise serializers.ValidationError(str(error))
+        data.seek(0)
+        if extension == 'jpeg':
+            extension = 'jpg'
+        data.name = f'{self.get_file_name(data)}.{extension}'
+        return serializers.FileField.to_internal_value(self, data)
 
 
 class UserSerializer(BaseUserSerializer):
     is_subscribed = serializers.SerializerMethodField()
     avatar = serializers.SerializerMethodField()
+    avatar_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = models.User
         fields = (
             'id', 'username', 'email',
             'first_name', 'last_name',
-            'is_subscribed', 'avatar',
+            'is_subscribed', 'avatar', 'avatar_variants',
         )
         read_only_fields = ('username',)
         required = ('email', 'first_name', 'last_name')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
         return (
             user.is_authenticated
@@ -35,6 +74,17 @@ class UserSerializer(BaseUserSerializer):
         except Exception:
             return ''
 
+    def get_avatar_variants(self, obj):
+        try:
+            profile = obj.profile
+        except models.Profile.DoesNotExist:
+            return {}
+        if not profile.avatar:
+            return {}
+        return images.get_variant_urls(
+            profile.avatar, profile.avatar_variants,
+            self.context.get('request'))
+
 
 class UserCreateSerializer(BaseUserCreateSerializer):
     email = serializers.EmailField()
@@ -61,7 +111,7 @@ class UserCreateSerializer(BaseUserCreateSerializer):
 class AvatarSerializer(serializers.ModelSerializer):
     user = serializers.HiddenField(
         default=serializers.CurrentUserDefault())
-    avatar = Base64ImageField()
+    avatar = ImageUploadField()
 
     class Meta:
         model = models.Profile
@@ -70,31 +120,30 @@ class AvatarSerializer(serializers.ModelSerializer):
 
 class SubscriptionSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(
+        source='profile.recipes_count', read_only=True)
 
     class Meta:
         model = models.User
         fields = (
             'id', 'username', 'email',
             'first_name', 'last_name',
-            'is_subscribed', 'avatar',
+            'is_subscribed', 'avatar', 'avatar_variants',
             'recipes', 'recipes_count',
         )
 
     def get_recipes(self, obj):
-        limit = self.context['request'].query_params.get('recipes_limit', None)
-        recipes = obj.recipes.order_by('-date_posted')
-        if limit is not None:
-            recipes = recipes[:int(limit)]
+        if hasattr(obj, 'latest_recipes'):
+            recipes = obj.latest_recipes
+        else:
+            limit = filters.get_recipes_limit(self.context['request'])
+            recipes = obj.recipes.order_by('-date_posted')[:limit]
         return RecipeMinifiedSerializer(
             instance=recipes,
             many=True,
             context=self.context
         ).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
 
 class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
@@ -102,9 +151,27 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
+class RecipeIngredientListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        validated_data = super().to_internal_value(data)
+        ingredients = ingredient_index.get_many(
+            {item['ingredient_id'] for item in validated_data})
+
+        missing = sorted({
+            item['ingredient_id'] for item in validated_data
+        } - ingredients.keys())
+        if missing:
+            raise serializers.ValidationError(
+                'ingredients do not exist: '
+                + ', '.join(str(pk) for pk in missing))
+
+        for item in validated_data:
+            item['ingredient'] = ingredients[item.pop('ingredient_id')]
+        return validated_data
+
+
 class RecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=models.Ingredient.objects, source='ingredient')
+    id = serializers.IntegerField(source='ingredient_id')
     name = serializers.CharField(
         read_only=True, source='ingredient.name')
     measurement_unit = serializers.CharField(
@@ -118,12 +185,28 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
             'id', 'amount',
             'name', 'measurement_unit'
         )
+        list_serializer_class = RecipeIngredientListSerializer
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        super().__init__(source='*', **kwargs)
+
+    def to_representation(self, value):
+        field_file = getattr(value, self.image_field)
+        if not field_file:
+            return {}
+        return images.get_variant_urls(
+            field_file, getattr(value, f'{self.image_field}_variants'),
+            self.context.get('request'))
 
 
 class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField()
+    image = ImageUploadField()
+    image_variants = ImageVariantsField('image')
     author = UserSerializer(read_only=True)
     ingredients = RecipeIngredientSerializer(many=True)
     cooking_time = serializers.IntegerField(
@@ -132,12 +215,30 @@ class RecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.Recipe
         fields = (
-            'id', 'author', 'name', 'image',
+            'id', 'author', 'name', 'image', 'image_variants',
             'ingredients', 'cooking_time', 'text',
             'is_favorited', 'is_in_shopping_cart',
         )
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'is_author_subscribed'):
+            instance.author.is_subscribed = instance.is_author_subscribed
+        return super().to_representation(instance)
+
+    def to_internal_value(self, data):
+        # Multipart requests send ingredients as a JSON encoded string
+        if html.is_html_input(data) and 'ingredients' in data:
+            data = data.dict()
+            try:
+                data['ingredients'] = json.loads(data['ingredients'])
+            except (TypeError, ValueError):
+                raise serializers.ValidationError(
+                    {'ingredients': 'invalid JSON'})
+        return super().to_internal_value(data)
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         return (
             user.is_authenticated
@@ -145,6 +246,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         return (
             user.is_authenticated
@@ -176,31 +279,108 @@ class RecipeSerializer(serializers.ModelSerializer):
         return super().validate(attrs)
 
     @staticmethod
-    def set_ingredients(instance, ingredients_data):
-        instance.ingredients.bulk_create([
-            models.RecipeIngredient(recipe=instance, **data)
-            for data in ingredients_data
-        ])
+    def set_ingredients(instance, ingredients):
+        # Serve the response from the saved rows instead of refetching
+        ingredients = sorted(
+            ingredients, key=lambda ingredient: ingredient.ingredient.name)
+        instance._prefetched_objects_cache = {'ingredients': ingredients}
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         validated_data['author'] = self.context['request'].user
         recipe = super().create(validated_data)
-        self.set_ingredients(recipe, ingredients_data)
+        self.set_ingredients(
+            recipe, models.RecipeIngredient.objects.bulk_create([
+                models.RecipeIngredient(recipe=recipe, **data)
+                for data in ingredients_data
+            ]))
+        # A new recipe can't be favorited, in a cart or self-subscribed
+        recipe.is_favorited = False
+        recipe.is_in_shopping_cart = False
+        recipe.is_author_subscribed = False
         return recipe
 
+    @classmethod
+    def update_ingredients(cls, instance, ingredients_data):
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in instance.ingredients.all()
+        }
+        submitted = {
+            data['ingredient'].pk: data for data in ingredients_data
+        }
+
+        deleted = [
+            recipe_ingredient.pk
+            for ingredient_id, recipe_ingredient in current.items()
+            if ingredient_id not in submitted
+        ]
+        created = [
+            models.RecipeIngredient(recipe=instance, **data)
+            for ingredient_id, data in submitted.items()
+            if ingredient_id not in current
+        ]
+        updated = []
+        deltas = {}
+        for ingredient_id, recipe_ingredient in current.items():
+            amount = submitted.get(ingredient_id, {}).get('amount', 0)
+            deltas[ingredient_id] = amount - recipe_ingredient.amount
+            if amount and deltas[ingredient_id]:
+                recipe_ingredient.amount = amount
+                updated.append(recipe_ingredient)
+        for recipe_ingredient in created:
+            deltas[recipe_ingredient.ingredient_id] = recipe_ingredient.amount
+
+        if deleted:
+            models.RecipeIngredient.objects.filter(pk__in=deleted).delete()
+        if created:
+            models.RecipeIngredient.objects.bulk_create(created)
+        if updated:
+            models.RecipeIngredient.objects.bulk_update(updated, ['amount'])
+        cls.set_ingredients(instance, created + [
+            recipe_ingredient
+            for ingredient_id, recipe_ingredient in current.items()
+            if ingredient_id in submitted
+        ])
+        return deltas
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         recipe = super().update(instance, validated_data)
-        instance.ingredients.all().delete()
-        self.set_ingredients(recipe, ingredients_data)
+        deltas = self.update_ingredients(recipe, ingredients_data)
+        if any(deltas.values()):
+            shopping_list.apply_recipe_delta(recipe.pk, deltas)
+            invalidation.recipes_changed([recipe.pk], shopping_lists=False)
         return recipe
 
 
 class RecipeMinifiedSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
+    image_variants = ImageVariantsField('image')
 
     class Meta:
         model = models.Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
         read_only = '__all__'
+
+
+class SimilarRecipeSerializer(RecipeMinifiedSerializer):
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeMinifiedSerializer.Meta):
+        fields = RecipeMinifiedSerializer.Meta.fields + ('similarity',)
+
+
+class PantryIngredientSerializer(IngredientSerializer):
+    amount = serializers.IntegerField()
+
+    class Meta(IngredientSerializer.Meta):
+        fields = IngredientSerializer.Meta.fields + ('amount',)
+
+
+class PantryMatchSerializer(serializers.Serializer):
+    recipe = RecipeMinifiedSerializer()
+    coverage = serializers.FloatField()
+    missing = PantryIngredientSerializer(many=True)
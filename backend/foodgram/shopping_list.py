@@ -0,0 +1,217 @@
+import csv
+import json
+
+from django.db import connection
+from django.db.models import aggregates
+
+from . import caching, models
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+def get_tables():
+    quote = connection.ops.quote_name
+    return {
+        'list': quote(models.ShoppingListIngredient._meta.db_table),
+        'cart': quote(models.ShoppingCartItem._meta.db_table),
+        'recipe_ingredient': quote(models.RecipeIngredient._meta.db_table),
+    }
+
+
+UPSERT_SQL = (
+    'INSERT INTO {list} (user_id, ingredient_id, total_amount) '
+    '{select} '
+    'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+    'SET total_amount = {list}.total_amount + excluded.total_amount'
+)
+
+
+def get_version_key(user_id):
+    return f'shopping-list-version:{user_id}'
+
+
+def get_version(user_id):
+    return ':'.join(str(caching.get_version(key)) for key in (
+        caching.INGREDIENTS_VERSION,
+        caching.SHOPPING_LISTS_VERSION,
+        get_version_key(user_id),
+    ))
+
+
+def bump_versions(user_ids):
+    caching.bump_version(*(get_version_key(user_id) for user_id in user_ids))
+
+
+def prune(**filters):
+    (
+        models.ShoppingListIngredient.objects
+        .filter(total_amount__lte=0, **filters)
+        .delete()
+    )
+
+
+def add_recipe(user_id, recipe_id, sign=1):
+    tables = get_tables()
+    select = (
+        'SELECT %s, ingredient_id, %s * SUM(amount) '
+        'FROM {recipe_ingredient} WHERE recipe_id = %s '
+        'GROUP BY ingredient_id'
+    ).format(**tables)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            UPSERT_SQL.format(select=select, **tables),
+            [user_id, sign, recipe_id])
+    if sign < 0:
+        prune(user_id=user_id)
+    bump_versions([user_id])
+
+
+def remove_recipe(user_id, recipe_id):
+    add_recipe(user_id, recipe_id, sign=-1)
+
+
+def apply_recipe_delta(recipe_id, deltas):
+    deltas = [
+        (ingredient_id, delta, recipe_id)
+        for ingredient_id, delta in deltas.items()
+        if delta
+    ]
+    if not deltas:
+        return
+    user_ids = list(
+        models.ShoppingCartItem.objects
+        .filter(recipe_id=recipe_id)
+        .values_list('user_id', flat=True))
+    if not user_ids:
+        return
+
+    tables = get_tables()
+    select = (
+        'SELECT user_id, %s, %s FROM {cart} WHERE recipe_id = %s'
+    ).format(**tables)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            UPSERT_SQL.format(select=select, **tables), deltas)
+    prune(user__shopping_cart__recipe_id=recipe_id)
+    bump_versions(user_ids)
+
+
+def rebuild(user_ids=None):
+    tables = get_tables()
+    select = (
+        'SELECT cart.user_id, ri.ingredient_id, SUM(ri.amount) '
+        'FROM {cart} cart '
+        'JOIN {recipe_ingredient} ri ON ri.recipe_id = cart.recipe_id '
+        'WHERE {condition} '
+        'GROUP BY cart.user_id, ri.ingredient_id'
+    )
+    list_items = models.ShoppingListIngredient.objects.all()
+    params = []
+    condition = '1 = 1'
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        list_items = list_items.filter(user_id__in=user_ids)
+        condition = 'cart.user_id IN ({})'.format(
+            ', '.join(['%s'] * len(user_ids)))
+        params = user_ids
+
+    list_items.delete()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            UPSERT_SQL.format(
+                select=select.format(condition=condition, **tables),
+                **tables),
+            params)
+
+    if user_ids is None:
+        caching.bump_version(caching.SHOPPING_LISTS_VERSION)
+    else:
+        bump_versions(user_ids)
+
+
+def rebuild_recipes(recipe_ids):
+    rebuild(
+        models.ShoppingCartItem.objects
+        .filter(recipe_id__in=recipe_ids)
+        .values_list('user_id', flat=True)
+        .distinct()
+    )
+
+
+def get_drift():
+    expected = {
+        (user_id, ingredient_id): total
+        for user_id, ingredient_id, total in (
+            models.ShoppingCartItem.objects
+            .filter(recipe__ingredients__isnull=False)
+            .values_list('user_id', 'recipe__ingredients__ingredient_id')
+            .annotate(total=aggregates.Sum('recipe__ingredients__amount'))
+            .order_by()
+        )
+    }
+    actual = {
+        (user_id, ingredient_id): total
+        for user_id, ingredient_id, total in (
+            models.ShoppingListIngredient.objects
+            .values_list('user_id', 'ingredient_id', 'total_amount')
+            .order_by()
+        )
+    }
+    return {
+        key: (expected.get(key), actual.get(key))
+        for key in expected.keys() | actual.keys()
+        if expected.get(key) != actual.get(key)
+    }
+
+
+def iter_items(user):
+    return (
+        user.shopping_list
+        .filter(total_amount__gt=0)
+        .order_by('ingredient__name')
+        .values_list(
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            'total_amount')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+def export_txt(items):
+    separator = ''
+    for name, unit, amount in items:
+        yield f'{separator}{name} ({unit}) - {amount}'
+        separator = '\n'
+
+
+class EchoBuffer:
+    def write(self, value):
+        return value
+
+
+def export_csv(items):
+    writer = csv.writer(EchoBuffer())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for item in items:
+        yield writer.writerow(item)
+
+
+def export_json(items):
+    separator = ''
+    yield '['
+    for name, unit, amount in items:
+        yield separator + json.dumps(
+            {'name': name, 'measurement_unit': unit, 'amount': amount},
+            ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+EXPORT_FORMATS = {
+    'txt': ('text/plain', export_txt),
+    'csv': ('text/csv', export_csv),
+    'json': ('application/json', export_json),
+}
@@ -0,0 +1,127 @@
+from django.db.models import signals
+from django.dispatch import receiver
+
+from . import (
+    caching, counters, feed, images, models, pantry, shopping_list,
+    similarity
+)
+
+
+@receiver(signals.post_save, sender=models.Recipe)
+@receiver(signals.post_delete, sender=models.Recipe)
+@receiver(signals.post_save, sender=models.Favorite)
+@receiver(signals.post_delete, sender=models.Favorite)
+@receiver(signals.post_save, sender=models.ShoppingCartItem)
+@receiver(signals.post_delete, sender=models.ShoppingCartItem)
+def invalidate_recipe_counts(sender, **kwargs):
+    caching.bump_version(caching.RECIPES_VERSION)
+
+
+@receiver(signals.post_save, sender=models.Recipe)
+@receiver(signals.post_delete, sender=models.Recipe)
+def invalidate_recipe_detail(sender, instance, **kwargs):
+    caching.bump_version(caching.get_recipe_version_key(instance.pk))
+
+
+@receiver(signals.post_save, sender=models.User)
+@receiver(signals.post_save, sender=models.Profile)
+@receiver(signals.post_delete, sender=models.Profile)
+def invalidate_author(sender, instance, **kwargs):
+    user_id = instance.pk if sender is models.User else instance.user_id
+    caching.bump_version(caching.get_author_version_key(user_id))
+
+
+@receiver(signals.post_save, sender=models.Ingredient)
+@receiver(signals.post_delete, sender=models.Ingredient)
+def invalidate_ingredient_catalog(sender, **kwargs):
+    caching.bump_version(caching.INGREDIENTS_VERSION)
+
+
+@receiver(signals.post_save, sender=models.ShoppingCartItem)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        shopping_list.add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(signals.post_delete, sender=models.ShoppingCartItem)
+def remove_from_shopping_list(sender, instance, origin=None, **kwargs):
+    origin_model = getattr(origin, 'model', type(origin))
+    if origin_model is models.ShoppingCartItem:
+        shopping_list.remove_recipe(instance.user_id, instance.recipe_id)
+    else:
+        # Cascading deletes may have removed the recipe's ingredients first
+        shopping_list.rebuild([instance.user_id])
+
+
+@receiver(signals.post_save, sender=models.Recipe)
+@receiver(signals.post_save, sender=models.Profile)
+def generate_image_variants(sender, instance, **kwargs):
+    if images.needs_variants(instance):
+        images.schedule_variants(instance)
+
+
+@receiver(signals.post_save, sender=models.Recipe)
+def fan_out_to_feeds(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out([instance.pk])
+
+
+@receiver(signals.post_save, sender=models.Subscription)
+def backfill_feed(sender, instance, created, **kwargs):
+    if created:
+        feed.backfill(instance.user_id, instance.subscribed_to_id)
+
+
+@receiver(signals.post_delete, sender=models.Subscription)
+def prune_feed(sender, instance, **kwargs):
+    feed.prune(instance.user_id, instance.subscribed_to_id)
+
+
+@receiver(signals.post_save, sender=models.Recipe)
+def add_to_pantry_matrix(sender, instance, created, **kwargs):
+    # Ingredient changes of existing recipes go through
+    # invalidation.recipes_changed
+    if created:
+        pantry.record_change([instance.pk])
+
+
+@receiver(signals.post_delete, sender=models.Recipe)
+def remove_from_pantry_matrix(sender, instance, **kwargs):
+    pantry.record_change([instance.pk])
+
+
+@receiver(signals.post_delete, sender=models.Ingredient)
+def rebuild_pantry_matrix(sender, **kwargs):
+    pantry.record_change()
+
+
+@receiver(signals.post_save, sender=models.Recipe)
+def refresh_similar_recipes(sender, instance, created, **kwargs):
+    if created:
+        similarity.schedule_refresh([instance.pk])
+
+
+@receiver(signals.pre_delete, sender=models.Recipe)
+def refresh_similar_recipes_on_delete(sender, instance, **kwargs):
+    # The lists pointing at the recipe are deleted along with it
+    similarity.schedule_refresh([instance.pk], stale_ids=(
+        models.SimilarRecipe.objects
+        .filter(similar_to=instance)
+        .values_list('recipe_id', flat=True)))
+
+
+@receiver(signals.post_save, sender=models.Favorite)
+@receiver(signals.post_save, sender=models.ShoppingCartItem)
+@receiver(signals.post_save, sender=models.Subscription)
+@receiver(signals.post_save, sender=models.Recipe)
+def increment_counters(sender, instance, created, **kwargs):
+    if created:
+        counters.update(sender, instance, 1)
+
+
+@receiver(signals.post_delete, sender=models.Favorite)
+@receiver(signals.post_delete, sender=models.ShoppingCartItem)
+@receiver(signals.post_delete, sender=models.Subscription)
+@receiver(signals.post_delete, sender=models.Recipe)
+def decrement_counters(sender, instance, **kwargs):
+    counters.update(sender, instance, -1)
@@ -0,0 +1,157 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import aggregates
+
+from . import models, pantry
+
+
+logger = logging.getLogger(__name__)
+
+NEIGHBOURS = 10
+BATCH_SIZE = 1000
+
+_executor = None
+
+
+class SimilarityIndex:
+    # Jaccard similarity of recipe ingredient sets over the pantry matrix,
+    # with the entries also ordered by ingredient so the recipes sharing
+    # an ingredient are a single slice
+    def __init__(self, matrix):
+        self.matrix = matrix
+        order = np.argsort(matrix.indices, kind='stable')
+        self.ingredients = matrix.indices[order]
+        self.ingredient_rows = matrix.rows[order]
+        self.positions = dict(
+            zip(matrix.recipe_ids.tolist(), range(len(matrix.recipe_ids))))
+
+    def get_scores(self, row):
+        matrix = self.matrix
+        entries = slice(matrix.indptr[row], matrix.indptr[row + 1])
+        ingredient_ids = matrix.indices[entries]
+        starts = np.searchsorted(self.ingredients, ingredient_ids, 'left')
+        ends = np.searchsorted(self.ingredients, ingredient_ids, 'right')
+        candidates, shared = np.unique(
+            np.concatenate([
+                self.ingredient_rows[start:end]
+                for start, end in zip(starts, ends)
+            ]),
+            return_counts=True)
+
+        other = candidates != row
+        candidates, shared = candidates[other], shared[other]
+        scores = shared / (
+            matrix.counts[row] + matrix.counts[candidates] - shared)
+        return candidates, scores
+
+    def neighbours(self, recipe_id, limit=NEIGHBOURS):
+        row = self.positions.get(recipe_id)
+        if row is None:
+            return []
+        candidates, scores = self.get_scores(row)
+        if len(candidates) > limit:
+            threshold = -np.partition(-scores, limit - 1)[limit - 1]
+            keep = scores >= threshold
+            candidates, scores = candidates[keep], scores[keep]
+        # Most similar first, newer recipes win ties
+        recipe_ids = self.matrix.recipe_ids[candidates]
+        order = np.lexsort((-recipe_ids, -scores))[:limit]
+        return list(zip(recipe_ids[order].tolist(), scores[order].tolist()))
+
+    def scores_with(self, recipe_id):
+        row = self.positions.get(recipe_id)
+        if row is None:
+            return {}
+        candidates, scores = self.get_scores(row)
+        return dict(zip(
+            self.matrix.recipe_ids[candidates].tolist(), scores.tolist()))
+
+
+def write_neighbours(index, recipe_ids):
+    rows = []
+    for recipe_id in recipe_ids:
+        rows.extend(
+            models.SimilarRecipe(
+                recipe_id=recipe_id, similar_to_id=similar_id, score=score)
+            for similar_id, score in index.neighbours(recipe_id))
+    models.SimilarRecipe.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+@transaction.atomic
+def rebuild(index=None):
+    index = index or SimilarityIndex(pantry.PantryMatrix.build())
+    models.SimilarRecipe.objects.all().delete()
+    recipe_ids = index.matrix.recipe_ids.tolist()
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        write_neighbours(index, recipe_ids[start:start + BATCH_SIZE])
+    return len(recipe_ids)
+
+
+@transaction.atomic
+def refresh(recipe_ids, stale_ids=()):
+    # Recompute the lists that contained a changed recipe and the lists
+    # a changed recipe now ranks high enough to enter, everything else
+    # keeps its neighbours
+    recipe_ids = set(recipe_ids)
+    index = SimilarityIndex(pantry.get_matrix())
+    affected = recipe_ids | set(stale_ids) | set(
+        models.SimilarRecipe.objects
+        .filter(similar_to__in=recipe_ids)
+        .values_list('recipe_id', flat=True))
+
+    scores = {}
+    for recipe_id in recipe_ids:
+        for other_id, score in index.scores_with(recipe_id).items():
+            if other_id not in affected:
+                scores[other_id] = max(score, scores.get(other_id, 0))
+    lowest = (
+        models.SimilarRecipe.objects
+        .filter(recipe__in=scores)
+        .values('recipe')
+        .annotate(
+            count=aggregates.Count('id'),
+            min_score=aggregates.Min('score'))
+        .values_list('recipe', 'count', 'min_score')
+    )
+    lowest = {recipe_id: (count, score) for recipe_id, count, score in lowest}
+    for other_id, score in scores.items():
+        count, min_score = lowest.get(other_id, (0, 0))
+        if count < NEIGHBOURS or score >= min_score:
+            affected.add(other_id)
+
+    models.SimilarRecipe.objects.filter(recipe__in=affected).delete()
+    write_neighbours(index, sorted(affected))
+    return affected
+
+
+def run_refresh(recipe_ids, stale_ids):
+    try:
+        refresh(recipe_ids, stale_ids)
+    except Exception:
+        logger.exception(
+            'Failed to refresh similar recipes for %s', sorted(recipe_ids))
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    # A single worker keeps refreshes from racing each other
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='similar-recipes')
+    return _executor
+
+
+def schedule_refresh(recipe_ids, stale_ids=()):
+    recipe_ids, stale_ids = set(recipe_ids), set(stale_ids)
+    if settings.SIMILAR_RECIPES_ASYNC:
+        transaction.on_commit(
+            lambda: get_executor().submit(run_refresh, recipe_ids, stale_ids))
+    else:
+        transaction.on_commit(lambda: refresh(recipe_ids, stale_ids))
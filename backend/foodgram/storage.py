@@ -0,0 +1,54 @@
+import hashlib
+import os
+import posixpath
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+
+CONTENT_NAME_RE = re.compile(
+    r'^(?:.+/)?[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(?:\.\w+)?$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    # Files are named by the sha256 of their content, e.g.
+    # recipes/ab/cd/abcd...png, so identical uploads share a single file
+    # and a stored name never changes its content
+    fan_out = 2
+
+    def get_content_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(
+            directory,
+            *(digest[i * 2:i * 2 + 2] for i in range(self.fan_out)),
+            digest + extension)
+
+    def _save(self, name, content):
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            return name
+        # Write under a unique name first, concurrent uploads of the same
+        # content then race only on the final atomic rename
+        temp_name = super()._save(f'{name}.{uuid.uuid4().hex}.part', content)
+        os.replace(self.path(temp_name), self.path(name))
+        return name
+
+    @staticmethod
+    def is_content_name(name):
+        return bool(CONTENT_NAME_RE.match(name))
+
+
+content_storage = ContentAddressedStorage()
+
+
+def get_content_storage():
+    return content_storage
@@ -7,7 +7,8 @@ user_short = {
 }
 user = user_short | {
     'is_subscribed': bool,
-    'avatar': str
+    'avatar': str,
+    'avatar_variants': dict
 }
 
 ingredient = {
@@ -23,6 +24,7 @@ recipe_short = {
     'id': int,
     'name': str,
     'image': str,
+    'image_variants': dict,
     'cooking_time': int
 }
 recipe = recipe_short | {
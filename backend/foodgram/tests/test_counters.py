@@ -0,0 +1,166 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import CommandError, call_command
+
+from foodgram import models, serializers
+from .utils import (
+    APIResponseTestCase, status, TEST_IMAGE_DATA, create_user, create_recipe
+)
+
+
+URL_RECIPES = '/api/recipes/'
+
+
+class CountersTestCase(APIResponseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = create_user('test_counters_user_1')
+        cls.user2 = create_user('test_counters_user_2')
+        cls.recipe1 = create_recipe('test_counters_recipe_1', cls.user1)
+        cls.recipe2 = create_recipe('test_counters_recipe_2', cls.user1)
+
+    def assert_counters(self, recipe, favorites, in_carts):
+        recipe.refresh_from_db()
+        self.assertEqual(
+            (recipe.favorites_count, recipe.in_carts_count),
+            (favorites, in_carts))
+
+    def assert_profile_counters(self, user, subscribers, recipes):
+        profile = models.Profile.objects.get(user=user)
+        self.assertEqual(
+            (profile.subscribers_count, profile.recipes_count),
+            (subscribers, recipes))
+
+    def test_counters(self):
+        self.assert_profile_counters(self.user1, 0, 2)
+        for user in (self.user1, self.user2):
+            self.assert_response(
+                f'/api/recipes/{self.recipe1.pk}/favorite/', method='post',
+                login_as=user, expected_status=status.HTTP_201_CREATED)
+        self.assert_response(
+            f'/api/recipes/{self.recipe1.pk}/shopping_cart/', method='post',
+            login_as=self.user2, expected_status=status.HTTP_201_CREATED)
+        self.assert_response(
+            f'/api/users/{self.user1.pk}/subscribe/', method='post',
+            login_as=self.user2, expected_status=status.HTTP_201_CREATED,
+            expected_data={'recipes_count': 2})
+        self.assert_counters(self.recipe1, 2, 1)
+        self.assert_profile_counters(self.user1, 1, 2)
+
+        self.assert_response(
+            f'/api/recipes/{self.recipe1.pk}/favorite/', method='delete',
+            login_as=self.user1, expected_status=status.HTTP_204_NO_CONTENT)
+        self.assert_response(
+            f'/api/users/{self.user1.pk}/subscribe/', method='delete',
+            login_as=self.user2, expected_status=status.HTTP_204_NO_CONTENT)
+        self.recipe2.delete()
+        self.assert_counters(self.recipe1, 1, 1)
+        self.assert_profile_counters(self.user1, 0, 1)
+
+        self.user2.delete()
+        self.assert_counters(self.recipe1, 0, 0)
+
+    def test_counters_kept_by_update(self):
+        update = serializers.RecipeSerializer.update
+
+        def favorite_during_update(serializer, instance, validated_data):
+            # The recipe was already loaded by the view
+            self.user2.favorites.create(recipe=instance)
+            return update(serializer, instance, validated_data)
+
+        with patch.object(
+            serializers.RecipeSerializer, 'update', favorite_during_update
+        ):
+            self.assert_response(
+                f'/api/recipes/{self.recipe1.pk}/', method='patch',
+                login_as=self.user1,
+                data={
+                    'name': 'test_counters_recipe_edit',
+                    'text': 'test recipe',
+                    'cooking_time': 1,
+                    'image': TEST_IMAGE_DATA,
+                    'ingredients': [{'id': 1, 'amount': 1}],
+                })
+        self.assert_counters(self.recipe1, 1, 0)
+        self.assertEqual(self.recipe1.name, 'test_counters_recipe_edit')
+
+        profile = models.Profile.objects.get(user=self.user1)
+        self.user2.subscriptions.create(subscribed_to=self.user1)
+        profile.save()
+        self.assert_profile_counters(self.user1, 1, 2)
+
+    def test_admin_keeps_counted_links(self):
+        subscription = self.user2.subscriptions.create(
+            subscribed_to=self.user1)
+        self.client.force_login(models.User.objects.create_superuser(
+            'test_counters_admin', 'admin@example.com', 'password'))
+        response = self.client.post(
+            f'/admin/foodgram/subscription/{subscription.pk}/change/',
+            {'user': self.user1.pk, 'subscribed_to': self.user2.pk},
+            format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        response = self.client.post(
+            f'/admin/foodgram/recipe/{self.recipe1.pk}/change/', {
+                'name': 'test_counters_recipe_edit',
+                'author': self.user2.pk,
+                'cooking_time': 1,
+                'text': 'test recipe',
+            }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+
+        subscription.refresh_from_db()
+        self.assertEqual(
+            (subscription.user, subscription.subscribed_to),
+            (self.user2, self.user1))
+        self.recipe1.refresh_from_db()
+        self.assertEqual(
+            (self.recipe1.name, self.recipe1.author),
+            ('test_counters_recipe_edit', self.user1))
+        self.assert_profile_counters(self.user1, 1, 2)
+        self.assert_profile_counters(self.user2, 0, 0)
+
+    def test_popular_ordering(self):
+        self.user2.favorites.create(recipe=self.recipe1)
+        response = self.assert_response(URL_RECIPES + '?ordering=popular')
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [self.recipe1.pk, self.recipe2.pk])
+
+        self.assert_response(
+            URL_RECIPES + '?ordering=name',
+            expected_status=status.HTTP_400_BAD_REQUEST)
+
+    def test_popular_ordering_cursor(self):
+        self.user2.favorites.create(recipe=self.recipe1)
+        response = self.assert_response(
+            URL_RECIPES + '?ordering=popular&limit=1&cursor=')
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [self.recipe1.pk])
+        response = self.assert_response(response.data['next'])
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [self.recipe2.pk])
+        self.assertIsNone(response.data['next'])
+        response = self.assert_response(response.data['previous'])
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [self.recipe1.pk])
+
+        self.assert_response(
+            URL_RECIPES + '?search=test&cursor=',
+            expected_status=status.HTTP_400_BAD_REQUEST)
+
+    def test_reconcile_command(self):
+        models.Recipe.objects.filter(pk=self.recipe1.pk).update(
+            favorites_count=5)
+        models.Profile.objects.filter(user=self.user1).update(
+            recipes_count=0)
+
+        with self.assertRaises(CommandError):
+            call_command('reconcile_counters', check=True, stdout=StringIO())
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assert_counters(self.recipe1, 0, 0)
+        self.assert_profile_counters(self.user1, 0, 2)
+        call_command('reconcile_counters', check=True, stdout=StringIO())
@@ -24,6 +24,13 @@ class FavoritesTestCase(APIResponseTestCase):
             expected_status=status.HTTP_201_CREATED,
             expected_data=get_recipe_json_short(self.recipe2))
 
+    def test_add_remove_queries(self):
+        self.client.force_authenticate(self.user1)
+        with self.assertNumQueries(3):
+            self.client.post(get_favorite_url(self.recipe2.pk))
+        with self.assertNumQueries(2):
+            self.client.delete(get_favorite_url(self.recipe2.pk))
+
     def test_add_not_found(self):
         self.assert_response(
             get_favorite_url(99999999), method='post',
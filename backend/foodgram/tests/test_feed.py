@@ -0,0 +1,104 @@
+from .utils import (
+    APIResponseTestCase, status,
+    create_user, create_recipe, get_recipe_json, get_user_json
+)
+from . import structs
+
+
+def get_subscribe_url(user_id):
+    return f'/api/users/{user_id}/subscribe/'
+
+
+URL_FEED = '/api/recipes/feed/'
+
+
+class FeedTestCase(APIResponseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = create_user('test_feed_user_1')
+        cls.user2 = create_user('test_feed_user_2')
+        cls.user3 = create_user('test_feed_user_3')
+        cls.recipe1 = create_recipe('test_feed_recipe_1', cls.user3)
+        cls.user1.subscriptions.create(user=cls.user1, subscribed_to=cls.user2)
+        cls.recipe2 = create_recipe('test_feed_recipe_2', cls.user2)
+        cls.recipe3 = create_recipe('test_feed_recipe_3', cls.user2)
+        cls.user1.favorites.create(user=cls.user1, recipe=cls.recipe2)
+
+    def get_feed_json(self, *recipes):
+        return [
+            get_recipe_json(recipe, self.user1)
+            | {'author': get_user_json(user=recipe.author, subscribed=True)}
+            for recipe in recipes
+        ]
+
+    def test_list(self):
+        response = self.assert_response(
+            URL_FEED, login_as=self.user1,
+            expected_struct={'results': [structs.recipe]},
+            expected_data={'previous': None, 'next': None})
+        self.assertEqual(
+            response.data['results'],
+            self.get_feed_json(self.recipe3, self.recipe2))
+
+        self.assert_response(
+            URL_FEED, login_as=self.user2,
+            expected_data={'results': []})
+
+    def test_list_pagination(self):
+        response = self.assert_response(
+            URL_FEED + '?limit=1', login_as=self.user1)
+        self.assertEqual(
+            response.data['results'], self.get_feed_json(self.recipe3))
+
+        response = self.assert_response(
+            response.data['next'], login_as=self.user1)
+        self.assertEqual(
+            response.data['results'], self.get_feed_json(self.recipe2))
+        self.assertIsNone(response.data['next'])
+
+        response = self.assert_response(
+            response.data['previous'], login_as=self.user1)
+        self.assertEqual(
+            response.data['results'], self.get_feed_json(self.recipe3))
+
+    def test_list_query_count(self):
+        self.client.force_authenticate(self.user1)
+        # entries, recipe ingredients
+        with self.assertNumQueries(2):
+            self.client.get(URL_FEED)
+
+    def test_fan_out(self):
+        recipe = create_recipe('test_feed_recipe_4', self.user2)
+        response = self.assert_response(URL_FEED, login_as=self.user1)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [recipe.pk, self.recipe3.pk, self.recipe2.pk])
+
+        recipe.delete()
+        response = self.assert_response(URL_FEED, login_as=self.user1)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [self.recipe3.pk, self.recipe2.pk])
+
+    def test_subscribe_backfill_and_prune(self):
+        self.assert_response(
+            get_subscribe_url(self.user3.pk), method='post',
+            login_as=self.user1,
+            expected_status=status.HTTP_201_CREATED)
+        response = self.assert_response(URL_FEED, login_as=self.user1)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [self.recipe3.pk, self.recipe2.pk, self.recipe1.pk])
+
+        self.assert_response(
+            get_subscribe_url(self.user2.pk), method='delete',
+            login_as=self.user1,
+            expected_status=status.HTTP_204_NO_CONTENT)
+        response = self.assert_response(URL_FEED, login_as=self.user1)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [self.recipe1.pk])
+
+    def test_no_auth(self):
+        self.assert_response(
+            URL_FEED, expected_status=status.HTTP_401_UNAUTHORIZED)
@@ -1,3 +1,13 @@
+import gzip
+import json
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from django.conf import settings
+from django.core.management import call_command
+
+from foodgram import models
 from .utils import APIResponseTestCase, status
 from . import structs
 
@@ -16,6 +26,38 @@ class IngredientTestCase(APIResponseTestCase):
             expected_struct=[structs.ingredient])
         self.assertGreater(len(response.data), 0)
 
+    def test_list_not_modified(self):
+        response = self.assert_response(URL_INGREDIENTS)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                URL_INGREDIENTS, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        models.Ingredient.objects.create(
+            name='тестовый ингредиент', measurement_unit='г')
+        response = self.client.get(
+            URL_INGREDIENTS, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_compressed(self):
+        response = self.assert_response(URL_INGREDIENTS)
+        compressed = self.client.get(
+            URL_INGREDIENTS, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(
+            json.loads(gzip.decompress(compressed.content)), response.data)
+        self.assertNotEqual(compressed['ETag'], response['ETag'])
+
+        not_modified = self.client.get(
+            URL_INGREDIENTS, headers={
+                'Accept-Encoding': 'gzip',
+                'If-None-Match': compressed['ETag']})
+        self.assertEqual(
+            not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified['ETag'], compressed['ETag'])
+
     def test_list_filter(self):
         response = self.assert_response(
             URL_INGREDIENTS + '?name=аб',
@@ -23,6 +65,49 @@ class IngredientTestCase(APIResponseTestCase):
         for item in response.data:
             self.assertTrue(item['name'].startswith('аб'))
 
+    def test_list_filter_no_queries(self):
+        self.client.get(URL_INGREDIENTS + '?name=аб')
+        with self.assertNumQueries(0):
+            response = self.client.get(URL_INGREDIENTS + '?name=АБРИКОС')
+        self.assert_struct(response.data, [structs.ingredient])
+        self.assertGreater(len(response.data), 0)
+        for item in response.data:
+            self.assertTrue(item['name'].startswith('абрикос'))
+
+    def test_list_filter_invalidation(self):
+        self.assert_response(URL_INGREDIENTS + '?name=тестовый')
+        ingredient = models.Ingredient.objects.create(
+            name='тестовый ингредиент', measurement_unit='г')
+        response = self.assert_response(URL_INGREDIENTS + '?name=тестовый')
+        self.assertEqual(response.data, [{
+            'id': ingredient.pk,
+            'name': 'тестовый ингредиент',
+            'measurement_unit': 'г'
+        }])
+
+    def test_load_ingredients_command(self):
+        data_dir = settings.BASE_DIR.parent / 'data'
+        for name in ('ingredients.csv', 'ingredients.json'):
+            stdout = StringIO()
+            call_command('load_ingredients', data_dir / name, stdout=stdout)
+            self.assertIn('0 inserted, 2186 unchanged', stdout.getvalue())
+
+        etag = self.assert_response(URL_INGREDIENTS)['ETag']
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'ingredients.csv'
+        path.write_text(
+            'абрикосовое варенье,г\n тестовый ингредиент , г\n',
+            encoding='utf-8')
+        stdout = StringIO()
+        call_command('load_ingredients', path, stdout=stdout)
+        self.assertIn('1 inserted, 1 unchanged', stdout.getvalue())
+
+        response = self.assert_response(URL_INGREDIENTS)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertTrue(models.Ingredient.objects.filter(
+            name='тестовый ингредиент', measurement_unit='г').exists())
+
     def test_detail(self):
         self.assert_response(
             get_ingredient_url(1),
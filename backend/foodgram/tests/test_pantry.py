@@ -0,0 +1,126 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.test import override_settings
+
+from foodgram import checks, models, pantry
+from .utils import (
+    APIResponseTestCase, status, TEST_IMAGE_DATA,
+    create_user, create_recipe, get_ingredient_json, get_recipe_json_short
+)
+
+
+URL_PANTRY = '/api/recipes/pantry/'
+
+
+class PantryTestCase(APIResponseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = create_user('test_pantry_user_1')
+        cls.recipe1 = create_recipe('test_pantry_recipe_1', cls.user1)
+        cls.recipe2 = create_recipe('test_pantry_recipe_2', cls.user1)
+        cls.recipe3 = create_recipe('test_pantry_recipe_3', cls.user1)
+        models.RecipeIngredient.objects.bulk_create([
+            models.RecipeIngredient(
+                recipe=cls.recipe2, ingredient_id=2, amount=20),
+            models.RecipeIngredient(
+                recipe=cls.recipe3, ingredient_id=2, amount=30),
+            models.RecipeIngredient(
+                recipe=cls.recipe3, ingredient_id=3, amount=40),
+        ])
+
+    def get_match_json(self, recipe, coverage, missing=()):
+        return {
+            'recipe': get_recipe_json_short(recipe),
+            'coverage': coverage,
+            'missing': [
+                get_ingredient_json(id=ingredient_id, amount=amount)
+                for ingredient_id, amount in missing
+            ],
+        }
+
+    def test_match(self):
+        response = self.assert_response(URL_PANTRY + '?ingredients=1,2')
+        self.assertEqual(response.data, [
+            self.get_match_json(self.recipe2, 1.0),
+            self.get_match_json(self.recipe1, 1.0),
+            self.get_match_json(self.recipe3, 2 / 3, [(3, 40)]),
+        ])
+
+        response = self.assert_response(URL_PANTRY + '?ingredients=3,9999')
+        self.assertEqual(response.data, [
+            self.get_match_json(self.recipe3, 1 / 3, [(1, 1), (2, 30)]),
+        ])
+
+    def test_match_limit(self):
+        response = self.assert_response(
+            URL_PANTRY + '?ingredients=1,2,3&limit=1')
+        self.assertEqual(
+            [match['recipe']['id'] for match in response.data],
+            [self.recipe3.pk])
+
+    def test_match_after_changes(self):
+        self.assert_response(URL_PANTRY + '?ingredients=1')
+        recipe = create_recipe('test_pantry_recipe_4', self.user1)
+        self.recipe1.delete()
+        self.assert_response(
+            f'/api/recipes/{self.recipe3.pk}/', method='patch',
+            login_as=self.user1,
+            data={
+                'name': 'test_pantry_recipe_3',
+                'text': 'test recipe',
+                'cooking_time': 1,
+                'image': TEST_IMAGE_DATA,
+                'ingredients': [{'id': 3, 'amount': 40}],
+            })
+
+        response = self.assert_response(URL_PANTRY + '?ingredients=1')
+        self.assertEqual(
+            [match['recipe']['id'] for match in response.data],
+            [recipe.pk, self.recipe2.pk])
+
+    def test_record_change_concurrent(self):
+        start = pantry.get_sequence()
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(
+                lambda recipe_id: pantry.record_change([recipe_id]),
+                range(100)))
+        # Every change is recorded right away and once committed
+        sequence = pantry.get_sequence()
+        self.assertEqual(sequence, start + 200)
+        changes = cache.get_many([
+            pantry.get_change_key(number)
+            for number in range(start + 1, sequence + 1)])
+        self.assertEqual(len(changes), 200)
+        self.assertEqual(
+            sorted(recipe_id for change in changes.values()
+                   for recipe_id in change),
+            sorted(list(range(100)) * 2))
+
+    def test_cache_check(self):
+        self.assertEqual(checks.check_cache_incr(None), [])
+        dummy = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+        with override_settings(CACHES={'default': dummy}):
+            self.assertEqual(
+                [error.id for error in checks.check_cache_incr(None)],
+                ['foodgram.E001'])
+
+    def test_match_large_ids(self):
+        ingredient = models.Ingredient.objects.create(
+            pk=2 ** 40, name='test_pantry_ingredient', measurement_unit='г')
+        models.RecipeIngredient.objects.create(
+            recipe=self.recipe1, ingredient=ingredient, amount=5)
+        response = self.assert_response(
+            URL_PANTRY + f'?ingredients={ingredient.pk}')
+        self.assertEqual(
+            [(match['recipe']['id'], match['coverage'])
+             for match in response.data],
+            [(self.recipe1.pk, 1 / 2)])
+
+    def test_match_invalid(self):
+        for query in ('', '?ingredients=', '?ingredients=a',
+                      '?ingredients=1&limit=0',
+                      '?ingredients=99999999999999999999'):
+            self.assert_response(
+                URL_PANTRY + query,
+                expected_status=status.HTTP_400_BAD_REQUEST)
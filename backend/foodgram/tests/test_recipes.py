@@ -1,6 +1,30 @@
+import json
+from io import BytesIO, StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import ANY, patch
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
 from .utils import (
     APIResponseTestCase, status, TEST_IMAGE_DATA,
-    create_user, create_recipe, get_recipe_json, get_ingredient_json
+    create_user, create_recipe, get_recipe_json, get_ingredient_json,
+    get_user_json, get_test_image_file, get_huge_image_file
+)
+from foodgram import (
+    caching, images, ingredient_index, models, pagination, serializers,
+    similarity
+)
+from foodgram.management.commands.export_recipes import (
+    Command as ExportRecipesCommand
 )
 from . import structs
 
@@ -70,11 +94,73 @@ class SubscriptionTestCase(APIResponseTestCase):
             URL_RECIPES + '?limit=1&page=2',
             expected_data={
                 'count': 3,
+                'count_exact': True,
                 'next': 'http://testserver' + URL_RECIPES + '?limit=1&page=3',
                 'previous': 'http://testserver' + URL_RECIPES + '?limit=1',
                 'results': [get_recipe_json(self.recipe2)]
             })
 
+    def test_list_cursor_pagination(self):
+        response = self.assert_response(
+            URL_RECIPES + '?limit=2&cursor=',
+            expected_data={
+                'previous': None,
+                'results': [
+                    get_recipe_json(self.recipe3),
+                    get_recipe_json(self.recipe2),
+                ]
+            })
+        self.assertNotIn('count', response.data)
+
+        response = self.assert_response(
+            response.data['next'],
+            expected_data={
+                'next': None,
+                'results': [get_recipe_json(self.recipe1)]
+            })
+
+        self.assert_response(
+            response.data['previous'],
+            expected_data={
+                'previous': None,
+                'results': [
+                    get_recipe_json(self.recipe3),
+                    get_recipe_json(self.recipe2),
+                ]
+            })
+
+    def test_list_cursor_position_filter(self):
+        self.assertEqual(
+            pagination.KeysetPagination.get_position_filter(
+                ('-date_posted', '-id'), ('2026-01-01', 5)),
+            Q(date_posted__lte='2026-01-01') & (
+                Q(date_posted__lt='2026-01-01')
+                | Q(date_posted='2026-01-01', id__lt=5)))
+        self.assertEqual(
+            pagination.KeysetPagination.get_position_filter(('id',), (5,)),
+            Q(id__gte=5) & Q(id__gt=5))
+
+    def test_list_cursor_invalid(self):
+        self.assert_response(
+            URL_RECIPES + '?cursor=invalid',
+            expected_status=status.HTTP_404_NOT_FOUND)
+
+    def test_list_query_count(self):
+        self.client.force_authenticate(self.user1)
+        self.client.get(URL_RECIPES)
+        with CaptureQueriesContext(connection) as single_page:
+            self.client.get(URL_RECIPES + '?limit=1')
+        with CaptureQueriesContext(connection) as full_page:
+            self.client.get(URL_RECIPES + '?limit=3')
+        self.assertEqual(len(single_page), len(full_page))
+
+    def test_list_count_invalidation(self):
+        url = URL_RECIPES + f'?author={self.user1.pk}'
+        self.assert_response(url, expected_data={'count': 2})
+        self.assert_response(url, expected_data={'count': 2})
+        self.recipe1.delete()
+        self.assert_response(url, expected_data={'count': 1})
+
     def test_list_filters(self):
         self.assert_response(
             URL_RECIPES + '?is_favorited=1',
@@ -104,6 +190,73 @@ class SubscriptionTestCase(APIResponseTestCase):
             URL_RECIPES + '?is_in_shopping_cart=1',
             expected_data={'results': []})
 
+    def test_list_ingredient_filters(self):
+        models.RecipeIngredient.objects.bulk_create([
+            models.RecipeIngredient(
+                recipe=self.recipe2, ingredient_id=2, amount=1),
+            models.RecipeIngredient(
+                recipe=self.recipe3, ingredient_id=3, amount=1),
+        ])
+
+        for query, recipes in (
+            ('?ingredients=1', [self.recipe3, self.recipe2, self.recipe1]),
+            ('?ingredients=1,2', [self.recipe2]),
+            ('?ingredients=2,3', []),
+            ('?any_ingredients=2,3', [self.recipe3, self.recipe2]),
+            ('?any_ingredients=3,4,5', [self.recipe3]),
+            (f'?any_ingredients=2,3&author={self.user2.pk}', [self.recipe3]),
+        ):
+            response = self.assert_response(URL_RECIPES + query)
+            self.assertEqual(
+                [recipe['id'] for recipe in response.data['results']],
+                [recipe.pk for recipe in recipes], query)
+
+        self.assert_response(
+            get_recipe_url(self.recipe2.pk), method='patch',
+            login_as=self.user1,
+            data=RECIPE_UPDATE_DATA | {
+                'ingredients': [{'id': 1, 'amount': 1}]})
+        self.assert_response(
+            URL_RECIPES + '?ingredients=1,2',
+            expected_data={'count': 0, 'results': []})
+
+        for query in (
+            '?ingredients=', '?ingredients=a', '?any_ingredients=,',
+            '?ingredients=99999999999999999999',
+            f'?any_ingredients=1,{2 ** 63}',
+        ):
+            self.assert_response(
+                URL_RECIPES + query,
+                expected_status=(
+                    status.HTTP_200_OK if query == '?ingredients='
+                    else status.HTTP_400_BAD_REQUEST))
+        self.assert_response(
+            URL_RECIPES + f'?ingredients={2 ** 63 - 1}',
+            expected_data={'count': 0, 'results': []})
+
+    def test_list_search(self):
+        name_match = create_recipe('капуста тушеная', self.user2)
+        text_match = create_recipe('борщ', self.user2)
+        text_match.text = 'свекла, капуста, морковь'
+        text_match.save()
+
+        response = self.assert_response(URL_RECIPES + '?search=капуста')
+        expected = [name_match.pk, text_match.pk]
+        if connection.vendor != 'postgresql':
+            # Only PostgreSQL ranks results, others keep the date order
+            expected.reverse()
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']], expected)
+        self.assertEqual(response.data['count'], 2)
+
+        self.assert_response(
+            URL_RECIPES + f'?search=борщ&author={self.user1.pk}',
+            expected_data={'count': 0, 'results': []})
+
+    def test_search_vector_deferred(self):
+        recipe = models.Recipe.objects.get(pk=self.recipe1.pk)
+        self.assertEqual(recipe.get_deferred_fields(), {'search_vector'})
+
     def test_detail(self):
         self.assert_response(
             get_recipe_url(self.recipe1.pk),
@@ -113,6 +266,51 @@ class SubscriptionTestCase(APIResponseTestCase):
             login_as=self.user1,
             expected_data=get_recipe_json(self.recipe1, self.user1))
 
+    def test_detail_version_keys(self):
+        for pk in ('99999', 'abc'):
+            self.assert_response(
+                get_recipe_url(pk), expected_status=status.HTTP_404_NOT_FOUND)
+        self.assert_response(get_recipe_url(f'0{self.recipe1.pk}'))
+        for pk in ('99999', 'abc', f'0{self.recipe1.pk}'):
+            self.assertIsNone(
+                cache.get(caching.get_recipe_version_key(pk)), pk)
+        self.assertIsNotNone(
+            cache.get(caching.get_recipe_version_key(self.recipe1.pk)))
+
+    def test_detail_cached(self):
+        url = get_recipe_url(self.recipe1.pk)
+        self.assert_response(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.data, get_recipe_json(self.recipe1))
+
+        self.client.force_authenticate(self.user2)
+        self.user2.subscriptions.create(
+            user=self.user2, subscribed_to=self.user1)
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(
+            response.data, get_recipe_json(self.recipe1, self.user2)
+            | {'author': get_user_json(user=self.user1, subscribed=True)})
+
+        self.assert_response(
+            url, login_as=self.user1,
+            expected_data=get_recipe_json(self.recipe1, self.user1))
+
+        self.user1.first_name = 'edited'
+        self.user1.save()
+        response = self.assert_response(url)
+        self.assertEqual(response.data['author']['first_name'], 'edited')
+
+        self.recipe1.name = 'test_recipe_edit'
+        self.recipe1.save()
+        self.assert_response(
+            url, expected_data={'name': 'test_recipe_edit'})
+
+        self.recipe1.delete()
+        self.assert_response(
+            url, expected_status=status.HTTP_404_NOT_FOUND)
+
     def test_detail_not_found(self):
         self.assert_response(
             get_recipe_url(99999999),
@@ -126,6 +324,155 @@ class SubscriptionTestCase(APIResponseTestCase):
             expected_status=status.HTTP_201_CREATED,
             expected_struct=structs.recipe)
 
+    def test_create_multipart(self):
+        self.client.force_authenticate(self.user1)
+        response = self.client.post(URL_RECIPES, RECIPE_CREATE_DATA | {
+            'image': get_test_image_file('image.gif'),
+            'ingredients': json.dumps(RECIPE_CREATE_DATA['ingredients']),
+        }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assert_struct(response.data, structs.recipe)
+        self.assertRegex(
+            response.data['image'],
+            r'https?:\/\/[^\/]+\/media\/recipes\/.*\.png')
+
+    def test_create_form_encoded(self):
+        self.client.force_authenticate(self.user1)
+        response = self.client.post(
+            URL_RECIPES, urlencode(RECIPE_CREATE_DATA | {
+                'ingredients': json.dumps(RECIPE_CREATE_DATA['ingredients']),
+            }),
+            content_type='application/x-www-form-urlencoded')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assert_struct(response.data, structs.recipe)
+
+    def test_create_multipart_invalid(self):
+        self.client.force_authenticate(self.user1)
+        for data in (
+            {'image': get_test_image_file('image.png', b'not an image')},
+            {'ingredients': '[{"id": 1,'},
+        ):
+            response = self.client.post(URL_RECIPES, RECIPE_CREATE_DATA | {
+                'image': get_test_image_file(),
+                'ingredients': json.dumps(RECIPE_CREATE_DATA['ingredients']),
+            } | data, format='multipart')
+            self.assertEqual(
+                response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_image_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.assert_response(
+                URL_RECIPES, method='post',
+                login_as=self.user1,
+                data=RECIPE_CREATE_DATA,
+                expected_status=status.HTTP_201_CREATED)
+        response = self.assert_response(get_recipe_url(response.data['id']))
+        variants = response.data['image_variants']
+        self.assertEqual(set(variants), {'card', 'detail'})
+        for urls in variants.values():
+            self.assertEqual(set(urls), {'webp', 'jpeg'})
+            self.assertRegex(
+                urls['webp'],
+                r'https?:\/\/[^\/]+\/media\/recipes\/variants\/.*\.webp')
+
+    def test_generate_image_variants_command(self):
+        call_command('generate_image_variants', stdout=StringIO())
+        response = self.assert_response(get_recipe_url(self.recipe1.pk))
+        self.assertEqual(
+            set(response.data['image_variants']), {'card', 'detail'})
+
+    def test_image_variants_large_jpeg(self):
+        source = Image.new('RGB', (4000, 3000), 'orange')
+        exif = source.getexif()
+        exif[0x0112] = 6
+        buffer = BytesIO()
+        source.save(buffer, 'JPEG', exif=exif)
+        self.recipe3.image.save(
+            'large.jpg', ContentFile(buffer.getvalue()), save=False)
+
+        variants = images.generate_variants(self.recipe3.image)
+        with self.recipe3.image.storage.open(
+            variants['detail']['jpeg']
+        ) as file:
+            self.assertEqual(Image.open(file).size, (900, 1200))
+
+        with patch.object(images, 'MAX_SOURCE_PIXELS', 1000):
+            with self.assertRaises(ValueError):
+                images.generate_variants(self.recipe3.image)
+
+    def test_create_multipart_too_large(self):
+        self.client.force_authenticate(self.user1)
+        with patch.object(images, 'MAX_SOURCE_PIXELS', 0):
+            response = self.client.post(URL_RECIPES, RECIPE_CREATE_DATA | {
+                'image': get_test_image_file(),
+                'ingredients': json.dumps(RECIPE_CREATE_DATA['ingredients']),
+            }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', response.data)
+
+        response = self.client.post(URL_RECIPES, RECIPE_CREATE_DATA | {
+            'image': get_huge_image_file(),
+            'ingredients': json.dumps(RECIPE_CREATE_DATA['ingredients']),
+        }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', response.data)
+
+    def test_image_content_addressed(self):
+        recipe = create_recipe('test_recipe_5', self.user2)
+        self.assertEqual(recipe.image.name, self.recipe1.image.name)
+        self.assertRegex(
+            recipe.image.name, r'^recipes/(\w\w)/(\w\w)/\1\2\w{60}\.png$')
+
+    def test_migrate_media_storage_command(self):
+        old_name = FileSystemStorage().save(
+            'recipes/old.png', ContentFile(get_test_image_file().read()))
+        self.recipe3.image.name = old_name
+        self.recipe3.save()
+
+        call_command('migrate_media_storage', stdout=StringIO())
+        self.recipe3.refresh_from_db()
+        self.assertEqual(self.recipe3.image.name, self.recipe1.image.name)
+        self.assertFalse(FileSystemStorage().exists(old_name))
+        response = self.assert_response(get_recipe_url(self.recipe3.pk))
+        self.assertEqual(
+            set(response.data['image_variants']), {'card', 'detail'})
+
+    def test_export_import_commands(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'recipes.ndjson'
+        call_command('export_recipes', str(path), stderr=StringIO())
+        lines = path.read_text(encoding='utf-8').splitlines()
+        self.assertEqual(len(lines), 3)
+
+        exported = {recipe['id']: recipe for recipe in map(json.loads, lines)}
+        path.write_text('\n'.join(lines + [
+            '{"name": "broken"}',
+            json.dumps(exported[self.recipe1.pk] | {'author': 'nobody'}),
+        ]), encoding='utf-8')
+        stderr = StringIO()
+        call_command(
+            'import_recipes', str(path), batch_size=2, stderr=stderr)
+        self.assertIn('3 rows', stderr.getvalue())
+        self.assertIn('skipped 2', stderr.getvalue())
+
+        imported = models.Recipe.objects.exclude(pk__in=exported)
+        self.assertEqual(len(imported), 3)
+        by_name = {recipe['name']: recipe for recipe in exported.values()}
+        for recipe in imported:
+            self.assertEqual(
+                ExportRecipesCommand.dump_recipe(recipe) | {'id': None},
+                by_name[recipe.name] | {'id': None})
+
+        # Larger imports rebuild all neighbours instead of tracking ids
+        with patch.object(similarity, 'BATCH_SIZE', 2), \
+                patch.object(similarity, 'rebuild') as rebuild, \
+                patch.object(similarity, 'refresh') as refresh:
+            call_command(
+                'import_recipes', str(path), batch_size=2, stderr=StringIO())
+        rebuild.assert_called_once_with()
+        refresh.assert_not_called()
+
     def test_create_invalid(self):
         self.assert_invalid_data(
             URL_RECIPES, RECIPE_CREATE_DATA,
@@ -157,6 +504,71 @@ class SubscriptionTestCase(APIResponseTestCase):
             expected_status=status.HTTP_400_BAD_REQUEST
         )
 
+    def test_create_query_count(self):
+        ingredient_index.get_index()
+        self.client.force_authenticate(self.user1)
+        for count in (1, 50):
+            # savepoint, recipe insert, feed fan-out, author recipes_count,
+            # ingredients insert, savepoint release; after commit: recipe
+            # and variants update, then in a savepoint the changed matrix
+            # rows, old neighbour lists, lowest scores, neighbours delete
+            # and insert
+            with self.assertNumQueries(15), \
+                    self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    URL_RECIPES, RECIPE_CREATE_DATA | {'ingredients': [
+                        {'id': pk, 'amount': 1}
+                        for pk in range(1, count + 1)
+                    ]})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            recipe = models.Recipe.objects.get(pk=response.data['id'])
+            self.assertEqual(
+                response.data,
+                get_recipe_json(recipe, self.user1) | {'image': ANY})
+
+    def test_update_query_count(self):
+        ingredient_index.get_index()
+        self.client.force_authenticate(self.user1)
+        for count in (1, 30):
+            # recipe, ingredients, savepoint, recipe update, ingredients
+            # write, carts lookup, savepoint release
+            with self.assertNumQueries(7):
+                response = self.client.patch(
+                    get_recipe_url(self.recipe1.pk),
+                    RECIPE_CREATE_DATA | {'ingredients': [
+                        {'id': pk, 'amount': 2}
+                        for pk in range(1, count + 1)
+                    ]})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            recipe = models.Recipe.objects.get(pk=self.recipe1.pk)
+            self.assertEqual(
+                response.data,
+                get_recipe_json(recipe, self.user1) | {'image': ANY})
+
+    def test_create_missing_ingredients(self):
+        response = self.assert_response(
+            URL_RECIPES, method='post',
+            login_as=self.user1,
+            data=RECIPE_CREATE_DATA | {'ingredients': [
+                {'id': 99999998, 'amount': 1},
+                {'id': 1, 'amount': 1},
+                {'id': 99999999, 'amount': 1},
+            ]},
+            expected_status=status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data['ingredients'],
+            ['ingredients do not exist: 99999998, 99999999'])
+
+    def test_validate_ingredients_queries(self):
+        ingredient_index.get_index()
+        serializer = serializers.RecipeSerializer(data=RECIPE_CREATE_DATA | {
+            'ingredients': [{'id': pk, 'amount': 1} for pk in range(1, 31)]})
+        with self.assertNumQueries(0):
+            self.assertTrue(serializer.is_valid())
+        self.assertEqual(
+            serializer.validated_data['ingredients'][29]['ingredient'].name,
+            models.Ingredient.objects.get(pk=30).name)
+
     def test_create_no_auth(self):
         self.assert_response(
             URL_RECIPES, method='post',
@@ -180,6 +592,36 @@ class SubscriptionTestCase(APIResponseTestCase):
             response.data.get('image'),
             r'https?:\/\/[^\/]+\/media\/recipes\/.*\..*')
 
+    def test_update_ingredients_diff(self):
+        url = get_recipe_url(self.recipe1.pk)
+        kept = self.recipe1.ingredients.get()
+        table = models.RecipeIngredient._meta.db_table
+
+        self.client.force_authenticate(self.user1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(url, RECIPE_UPDATE_DATA | {
+                'ingredients': [{'id': 1, 'amount': 1}]})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if table in query['sql']
+            and not query['sql'].startswith('SELECT')
+        ])
+
+        self.client.patch(url, RECIPE_UPDATE_DATA | {
+            'ingredients': [{'id': 1, 'amount': 5}, {'id': 2, 'amount': 2}]})
+        self.assertEqual(
+            list(self.recipe1.ingredients.values_list(
+                'pk', 'ingredient_id', 'amount').order_by('ingredient_id')),
+            [(kept.pk, 1, 5), (ANY, 2, 2)])
+
+        self.client.patch(url, RECIPE_UPDATE_DATA | {
+            'ingredients': [{'id': 2, 'amount': 2}]})
+        self.assertEqual(
+            list(self.recipe1.ingredients.values_list(
+                'ingredient_id', 'amount')),
+            [(2, 2)])
+
     def test_update_no_auth(self):
         self.assert_response(
             get_recipe_url(self.recipe1.pk), method='patch',
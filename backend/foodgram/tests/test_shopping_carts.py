@@ -1,5 +1,11 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+
+from foodgram import models
 from .utils import (
-    APIResponseTestCase, status,
+    APIResponseTestCase, status, TEST_IMAGE_DATA,
     create_user, create_recipe, get_recipe_json_short
 )
 
@@ -8,6 +14,12 @@ def get_recipe_cart_url(recipe_id):
     return f'/api/recipes/{recipe_id}/shopping_cart/'
 
 
+def get_content(response):
+    if response.streaming:
+        return b''.join(response.streaming_content).decode()
+    return response.content.decode()
+
+
 URL_DOWNLOAD_CART = '/api/recipes/download_shopping_cart/'
 
 
@@ -74,9 +86,131 @@ class FavoritesTestCase(APIResponseTestCase):
             URL_DOWNLOAD_CART,
             login_as=self.user2)
         self.assertEqual(
-            response.content.decode(),
+            get_content(response),
             'абрикосовое варенье (г) - 2')
 
+    def test_download_cart_formats(self):
+        response = self.assert_response(
+            URL_DOWNLOAD_CART + '?format=csv',
+            login_as=self.user2)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(
+            get_content(response),
+            'name,measurement_unit,amount\r\n'
+            'абрикосовое варенье,г,2\r\n')
+
+        response = self.assert_response(
+            URL_DOWNLOAD_CART + '?format=json',
+            login_as=self.user2)
+        self.assertEqual(json.loads(get_content(response)), [{
+            'name': 'абрикосовое варенье',
+            'measurement_unit': 'г',
+            'amount': 2
+        }])
+
+        self.assert_response(
+            URL_DOWNLOAD_CART + '?format=pdf',
+            login_as=self.user2,
+            expected_status=status.HTTP_400_BAD_REQUEST)
+
+    def test_download_cart_cached(self):
+        response = self.assert_response(
+            URL_DOWNLOAD_CART,
+            login_as=self.user2)
+        content = get_content(response)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(URL_DOWNLOAD_CART)
+        self.assertEqual(get_content(response), content)
+
+        response = self.client.get(
+            URL_DOWNLOAD_CART, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.user2.shopping_cart.filter(recipe=self.recipe2).delete()
+        response = self.client.get(
+            URL_DOWNLOAD_CART, headers={'If-None-Match': etag})
+        self.assertEqual(
+            get_content(response),
+            'абрикосовое варенье (г) - 1')
+
+    def test_download_cart_after_changes(self):
+        self.user2.shopping_cart.filter(recipe=self.recipe2).delete()
+        response = self.assert_response(
+            URL_DOWNLOAD_CART,
+            login_as=self.user2)
+        self.assertEqual(
+            get_content(response),
+            'абрикосовое варенье (г) - 1')
+
+        self.recipe1.ingredients.update(amount=5)
+        models.RecipeIngredient.objects.create(
+            recipe=self.recipe1, amount=3,
+            ingredient=models.Ingredient.objects.get(pk=2))
+        call_command('rebuild_shopping_lists', stdout=StringIO())
+        response = self.assert_response(
+            URL_DOWNLOAD_CART,
+            login_as=self.user2)
+        self.assertEqual(
+            get_content(response),
+            'абрикосовое варенье (г) - 5\nабрикосовое пюре (г) - 3')
+
+        self.recipe1.delete()
+        response = self.assert_response(
+            URL_DOWNLOAD_CART,
+            login_as=self.user2)
+        self.assertEqual(get_content(response), '')
+
+    def test_download_cart_after_recipe_update(self):
+        self.assert_response(
+            f'/api/recipes/{self.recipe1.pk}/', method='patch',
+            login_as=self.user2,
+            data={
+                'ingredients': [
+                    {'id': 1, 'amount': 4},
+                    {'id': 2, 'amount': 2}
+                ],
+                'image': TEST_IMAGE_DATA,
+                'name': 'test_cart_recipe_1',
+                'text': 'test recipe',
+                'cooking_time': 1
+            })
+        response = self.assert_response(
+            URL_DOWNLOAD_CART,
+            login_as=self.user1)
+        self.assertEqual(
+            get_content(response),
+            'абрикосовое варенье (г) - 4\nабрикосовое пюре (г) - 2')
+        response = self.assert_response(
+            URL_DOWNLOAD_CART,
+            login_as=self.user2)
+        self.assertEqual(
+            get_content(response),
+            'абрикосовое варенье (г) - 5\nабрикосовое пюре (г) - 2')
+
+    def test_download_cart_after_admin_move(self):
+        admin = models.User.objects.create_superuser(
+            'test_cart_admin', 'admin@example.com', 'password')
+        row = self.recipe1.ingredients.get()
+        self.client.force_login(admin)
+        response = self.client.post(
+            f'/admin/foodgram/recipeingredient/{row.pk}/change/',
+            {'recipe': self.recipe2.pk, 'ingredient': 2, 'amount': 3},
+            format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+
+        response = self.assert_response(
+            URL_DOWNLOAD_CART,
+            login_as=self.user1)
+        self.assertEqual(get_content(response), '')
+        response = self.assert_response(
+            URL_DOWNLOAD_CART,
+            login_as=self.user2)
+        self.assertEqual(
+            get_content(response),
+            'абрикосовое варенье (г) - 1\nабрикосовое пюре (г) - 3')
+
     def test_download_cart_no_auth(self):
         self.assert_response(
             URL_DOWNLOAD_CART,
@@ -0,0 +1,115 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import override_settings
+
+from foodgram import models, similarity
+from .utils import (
+    APIResponseTestCase, status, TEST_IMAGE_DATA,
+    create_user, create_recipe, get_recipe_json_short
+)
+
+
+def get_similar_url(recipe_id):
+    return f'/api/recipes/{recipe_id}/similar/'
+
+
+class SimilarRecipesTestCase(APIResponseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = create_user('test_similar_user_1')
+        cls.recipe1 = create_recipe('test_similar_recipe_1', cls.user1)
+        cls.recipe2 = create_recipe('test_similar_recipe_2', cls.user1)
+        cls.recipe3 = create_recipe('test_similar_recipe_3', cls.user1)
+        cls.recipe4 = create_recipe('test_similar_recipe_4', cls.user1)
+        cls.recipe4.ingredients.update(ingredient_id=4)
+        models.RecipeIngredient.objects.bulk_create([
+            models.RecipeIngredient(
+                recipe=cls.recipe2, ingredient_id=2, amount=1),
+            models.RecipeIngredient(
+                recipe=cls.recipe3, ingredient_id=2, amount=1),
+            models.RecipeIngredient(
+                recipe=cls.recipe3, ingredient_id=3, amount=1),
+        ])
+        call_command('build_similar_recipes', stdout=StringIO())
+
+    def assert_similar(self, recipe, *expected):
+        response = self.assert_response(get_similar_url(recipe.pk))
+        self.assertEqual(
+            [(item['id'], item['similarity']) for item in response.data],
+            [(similar.pk, score) for similar, score in expected])
+
+    def test_similar(self):
+        response = self.assert_response(get_similar_url(self.recipe1.pk))
+        self.assertEqual(response.data, [
+            get_recipe_json_short(self.recipe2) | {'similarity': 1 / 2},
+            get_recipe_json_short(self.recipe3) | {'similarity': 1 / 3},
+        ])
+        self.assert_similar(
+            self.recipe1, (self.recipe2, 1 / 2), (self.recipe3, 1 / 3))
+        self.assert_similar(
+            self.recipe2, (self.recipe3, 2 / 3), (self.recipe1, 1 / 2))
+        self.assert_similar(self.recipe4)
+
+    def test_similar_not_found(self):
+        for recipe_id in (0, 'abc'):
+            self.assert_response(
+                get_similar_url(recipe_id),
+                expected_status=status.HTTP_404_NOT_FOUND)
+
+    def test_similar_after_update(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assert_response(
+                f'/api/recipes/{self.recipe4.pk}/', method='patch',
+                login_as=self.user1,
+                data={
+                    'name': 'test_similar_recipe_4',
+                    'text': 'test recipe',
+                    'cooking_time': 1,
+                    'image': TEST_IMAGE_DATA,
+                    'ingredients': [
+                        {'id': 1, 'amount': 1}, {'id': 2, 'amount': 1}],
+                })
+        self.assert_similar(
+            self.recipe1, (self.recipe4, 1 / 2), (self.recipe2, 1 / 2),
+            (self.recipe3, 1 / 3))
+        self.assert_similar(
+            self.recipe4, (self.recipe2, 1.0), (self.recipe3, 2 / 3),
+            (self.recipe1, 1 / 2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe2.delete()
+        self.assert_similar(
+            self.recipe3, (self.recipe4, 2 / 3), (self.recipe1, 1 / 3))
+        self.assert_similar(
+            self.recipe4, (self.recipe3, 2 / 3), (self.recipe1, 1 / 2))
+
+    @override_settings(SIMILAR_RECIPES_ASYNC=True)
+    def test_refresh_in_background(self):
+        with patch.object(similarity, 'get_executor') as get_executor, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.assert_response(
+                f'/api/recipes/{self.recipe4.pk}/', method='patch',
+                login_as=self.user1,
+                data={
+                    'name': 'test_similar_recipe_4',
+                    'text': 'test recipe',
+                    'cooking_time': 1,
+                    'image': TEST_IMAGE_DATA,
+                    'ingredients': [{'id': 1, 'amount': 1}],
+                })
+        # The request only hands the refresh over to the worker
+        get_executor().submit.assert_called_once_with(
+            similarity.run_refresh, {self.recipe4.pk}, set())
+        self.assert_similar(
+            self.recipe1, (self.recipe2, 1 / 2), (self.recipe3, 1 / 3))
+
+        similarity.run_refresh({self.recipe4.pk}, set())
+        self.assert_similar(
+            self.recipe1, (self.recipe4, 1.0), (self.recipe2, 1 / 2),
+            (self.recipe3, 1 / 3))
+
+        with patch.object(similarity, 'refresh', side_effect=ValueError), \
+                self.assertLogs(similarity.logger, 'ERROR'):
+            similarity.run_refresh({self.recipe1.pk}, set())
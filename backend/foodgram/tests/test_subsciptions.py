@@ -1,3 +1,6 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
 from .utils import (
     APIResponseTestCase, status,
     create_user, create_recipe, get_user_json, get_recipe_json_short
@@ -84,6 +87,21 @@ class SubscriptionTestCase(APIResponseTestCase):
             response.data['results'][0]['recipes'],
             [get_recipe_json_short(self.recipe2)])
 
+    def test_list_recipe_limit_invalid(self):
+        for value in ('0', '-1', 'abc'):
+            self.assert_response(
+                URL_SUBSCRIPTIONS + f'?recipes_limit={value}',
+                login_as=self.user1,
+                expected_status=status.HTTP_400_BAD_REQUEST)
+
+    def test_list_query_count(self):
+        self.client.force_authenticate(self.user1)
+        with CaptureQueriesContext(connection) as single_page:
+            self.client.get(URL_SUBSCRIPTIONS + '?limit=1')
+        with CaptureQueriesContext(connection) as full_page:
+            self.client.get(URL_SUBSCRIPTIONS + '?limit=3')
+        self.assertEqual(len(single_page), len(full_page))
+
     def test_list_no_auth(self):
         self.assert_response(
             URL_SUBSCRIPTIONS,
@@ -1,6 +1,6 @@
 from .utils import (
     APIResponseTestCase, status, TEST_IMAGE_DATA,
-    create_user, get_user_json
+    create_user, get_user_json, get_test_image_file, get_huge_image_file
 )
 from . import structs
 
@@ -104,6 +104,31 @@ class UserTestCase(APIResponseTestCase):
             response.data.get('avatar'),
             r'https?:\/\/[^\/]+\/media\/users\/.*\..*')
 
+    def test_avatar_multipart(self):
+        self.client.force_authenticate(self.user1)
+        response = self.client.put(
+            URL_AVATAR, {'avatar': get_test_image_file()},
+            format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRegex(
+            response.data.get('avatar'),
+            r'https?:\/\/[^\/]+\/media\/users\/.*\.png')
+
+        response = self.client.put(
+            URL_AVATAR, {'avatar': get_huge_image_file()},
+            format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_avatar_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assert_response(
+                URL_AVATAR, method='put',
+                login_as=self.user1,
+                data=AVATAR_CREATE_DATA)
+        response = self.assert_response(get_user_url(self.user1.pk))
+        self.assertEqual(
+            set(response.data['avatar_variants']['avatar']), {'webp', 'jpeg'})
+
     def test_avatar_invalid(self):
         self.assert_response(
             URL_AVATAR, method='put',
@@ -1,3 +1,9 @@
+import struct
+import zlib
+from base64 import b64decode
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework import status
 from rest_framework.test import APITestCase, override_settings, settings
 from drf_extra_fields.fields import Base64ImageField
@@ -5,8 +11,18 @@ from drf_extra_fields.fields import Base64ImageField
 from foodgram import models
 
 
-@override_settings(MEDIA_ROOT=settings.BASE_DIR / 'test_media')
+@override_settings(
+    MEDIA_ROOT=settings.BASE_DIR / 'test_media',
+    SNAPSHOT_ROOT=settings.BASE_DIR / 'test_media' / 'snapshots',
+    IMAGE_VARIANTS_ASYNC=False,
+    SIMILAR_RECIPES_ASYNC=False,
+    CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+)
 class APIResponseTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+
     def assert_response(
         self, url, method='get',
         login_as=None,
@@ -22,6 +38,12 @@ class APIResponseTestCase(APITestCase):
             response = func(url)
         else:
             response = func(url, data)
+        if (
+            not hasattr(response, 'data')
+            and not response.streaming
+            and response.get('Content-Type') == 'application/json'
+        ):
+            response.data = response.json()
         if debug_log:
             print(f'''
 -----------------------------------
@@ -68,6 +90,24 @@ AAABAgMAAABieywaAAAACVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVK\
 w4bAAAACklEQVQImWNoAAAAggCByxOyYQAAAABJRU5ErkJggg=='
 
 
+def get_test_image_file(name='image.png', content=None):
+    if content is None:
+        content = b64decode(TEST_IMAGE_DATA.split(',')[1])
+    return SimpleUploadedFile(name, content)
+
+
+def get_huge_image_file(width=20000, height=20000):
+    # A PNG header declaring far more pixels than Pillow opens by default
+    def chunk(kind, data):
+        return (
+            struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(kind + data)))
+    return SimpleUploadedFile('image.png', (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        + chunk(b'IEND', b'')))
+
+
 def create_user(username):
     user = models.User(
         email=f'{username}@example.com',
@@ -113,6 +153,7 @@ def get_user_json(id=None, username=None, user=None,
     res.update(
         is_subscribed=subscribed,
         avatar=avatar,
+        avatar_variants={},
         **kwargs
     )
     return res
@@ -139,6 +180,7 @@ def get_recipe_json_short(recipe):
         'id': recipe.pk,
         'name': recipe.name,
         'image': image,
+        'image_variants': {},
         'cooking_time': recipe.cooking_time
     }
 
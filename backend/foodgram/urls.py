@@ -14,17 +14,20 @@ urlpatterns = [
         {'put': 'update', 'delete': 'destroy'}), name='avatar'),
     path('users/subscriptions/', views.SubscriptionViewSet.as_view(
         {'get': 'list'}), name='subscriptions'),
-    path('users/<id>/subscribe/', views.SubscriptionViewSet.as_view(
+    path('users/<int:id>/subscribe/', views.SubscriptionViewSet.as_view(
         {'post': 'create', 'delete': 'destroy'}), name='subscribe'),
 
+    path('recipes/feed/', views.FeedViewSet.as_view(
+        {'get': 'list'}), name='feed'),
+    path('recipes/pantry/', views.PantryView.as_view(), name='pantry'),
     path('recipes/download_shopping_cart/',
          views.DownloadShoppingCartView.as_view(),
          name='download_shopping_cart'),
-    path('recipes/<id>/get-link/',
+    path('recipes/<int:id>/get-link/',
          views.RecipeLinkView.as_view(), name='get-short-link'),
-    path('recipes/<id>/favorite/',
+    path('recipes/<int:id>/favorite/',
          views.FavoriteView.as_view(), name='favorite_recipe'),
-    path('recipes/<id>/shopping_cart/',
+    path('recipes/<int:id>/shopping_cart/',
          views.ShoppingCartView.as_view(), name='shopping_cart'),
 
     path('', include(router_root.urls)),
@@ -1,20 +1,44 @@
-from django.db.models import QuerySet, aggregates, Q
-from django.http import HttpResponse
+from django.db.models import (
+    F, Exists, OuterRef, Value, Prefetch, Window
+)
+from django.db.models.functions import RowNumber
+from django.core.cache import cache
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http import (
+    HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+)
+from django.utils.http import http_date, parse_etags
 from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.reverse import reverse
 from rest_framework.generics import get_object_or_404
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.viewsets import (
     ModelViewSet, ReadOnlyModelViewSet,
     GenericViewSet, mixins
 )
 
-from . import models, serializers, filters, permissions
+from . import (
+    models, serializers, filters, pagination, permissions, caching,
+    ingredient_index, ingredient_catalog, pantry, shopping_list
+)
+
+
+class StreamingUploadMixin:
+    parser_classes = (JSONParser, FormParser, MultiPartParser)
+
+    def initialize_request(self, request, *args, **kwargs):
+        # Stream uploaded files to disk instead of keeping them in memory
+        request.upload_handlers = [TemporaryFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
 
 
 class AvatarViewSet(
+    StreamingUploadMixin,
     mixins.UpdateModelMixin,
     mixins.DestroyModelMixin,
     GenericViewSet
@@ -27,42 +51,54 @@ class AvatarViewSet(
 
 class SubscriptionViewSet(mixins.ListModelMixin, GenericViewSet):
     serializer_class = serializers.SubscriptionSerializer
+    pagination_class = pagination.PageNumberOrKeysetPagination
+    cursor_ordering = ('id',)
 
     def get_queryset(self):
-        return (
+        return self.annotate_subscriptions(
             models.User.objects
             .filter(subscribers__user=self.request.user)
         )
 
-    def create(self, request, id, *args, **kwargs):
-        subscribed_to = get_object_or_404(models.User, pk=id)
-        queryset = (
-            request.user.subscriptions
-            .filter(subscribed_to=subscribed_to)
+    def annotate_subscriptions(self, queryset):
+        recipes = models.Recipe.objects.annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F('author'),
+                order_by=(F('date_posted').desc(), F('pk').desc())
+            )
+        ).filter(row_number__lte=filters.get_recipes_limit(self.request))
+
+        return (
+            queryset
+            .select_related('profile')
+            .annotate(is_subscribed=Value(True))
+            .prefetch_related(Prefetch(
+                'recipes', queryset=recipes, to_attr='latest_recipes'))
+            .order_by('id')
         )
 
-        if (
-            subscribed_to == self.request.user
-            or queryset.exists()
-        ):
+    def create(self, request, id, *args, **kwargs):
+        if id == request.user.pk:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        instance = models.Subscription.objects.create(
-            user=request.user, subscribed_to=subscribed_to)
-        serializer = self.get_serializer(instance=instance.subscribed_to)
+        instance = models.Subscription.objects.create_unique(
+            request.user, subscribed_to=id)
+        subscribed_to = get_object_or_404(
+            self.annotate_subscriptions(models.User.objects.all()), pk=id)
+        if instance is None:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.get_serializer(instance=subscribed_to)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def destroy(self, request, id, *args, **kwargs):
-        subscribed_to = get_object_or_404(models.User, pk=id)
-        queryset = (
-            request.user.subscriptions
-            .filter(subscribed_to=subscribed_to)
-        )
-
-        if not queryset.exists():
+        instance = models.Subscription.objects.delete_unique(
+            request.user, subscribed_to=id)
+        if instance is None:
+            get_object_or_404(models.User, pk=id)
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        queryset.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -73,12 +109,257 @@ class IngredientViewSet(ReadOnlyModelViewSet):
     filter_backends = (filters.NameSearchFilter,)
     permission_classes = (AllowAny,)
 
-
-class RecipeViewSet(ModelViewSet):
-    queryset = models.Recipe.objects.all()
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get(filters.NameSearchFilter.search_param)
+        if not name:
+            return self.list_catalog(request)
+        return Response(ingredient_index.search(name))
+
+    def list_catalog(self, request):
+        version = caching.get_version(caching.INGREDIENTS_VERSION)
+        encoding = ingredient_catalog.get_encoding(
+            request.headers.get('Accept-Encoding', ''))
+        headers = {
+            'ETag': ingredient_catalog.get_etag(version, encoding),
+            'Last-Modified': http_date(version // 10 ** 9),
+            'Vary': 'Accept-Encoding',
+        }
+
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if '*' in if_none_match:
+            return HttpResponseNotModified(headers=headers)
+        for variant in ingredient_catalog.ENCODINGS:
+            etag = ingredient_catalog.get_etag(version, variant)
+            if etag in if_none_match:
+                return HttpResponseNotModified(
+                    headers=headers | {'ETag': etag})
+
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return HttpResponse(
+            ingredient_catalog.get_snapshot(version, encoding),
+            content_type='application/json', headers=headers)
+
+
+class RecipeViewSet(StreamingUploadMixin, ModelViewSet):
     serializer_class = serializers.RecipeSerializer
     filter_backends = (filters.RecipeFilterBackend,)
     permission_classes = (permissions.AdminAuthorOrReadOnly,)
+    pagination_class = pagination.PageNumberOrKeysetPagination
+    count_version_key = caching.RECIPES_VERSION
+    detail_cache_timeout = 60 * 60
+
+    @property
+    def cursor_ordering(self):
+        # Search results are ordered by rank, which is computed per query
+        if self.request.query_params.get('search', '').strip():
+            return None
+        return filters.RECIPE_ORDERINGS.get(
+            self.request.query_params.get('ordering'),
+            ('-date_posted', '-id'))
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = self.kwargs['pk']
+        instance = None
+        recipe_version = cache.get(caching.get_recipe_version_key(pk))
+        if recipe_version is None:
+            # Versions never expire, so they are only created for recipes
+            # that exist, not for whatever pk a client asks for
+            instance = self.get_object()
+            pk = instance.pk
+            recipe_version = caching.get_version(
+                caching.get_recipe_version_key(pk))
+        cache_key = 'recipe-detail:{}:{}:{}:{}'.format(
+            request.build_absolute_uri('/'), pk, recipe_version,
+            caching.get_version(caching.INGREDIENTS_VERSION))
+
+        cached = cache.get(cache_key)
+        if cached is not None:
+            author_version = caching.get_version(
+                caching.get_author_version_key(cached['author']['id']))
+            if cached.pop('author_version') == author_version:
+                return Response(self.overlay_user_flags(cached))
+
+        if instance is None:
+            instance = self.get_object()
+        author_version = caching.get_version(
+            caching.get_author_version_key(instance.author_id))
+        data = self.get_serializer(instance).data
+        cache.set(
+            cache_key, dict(data, author_version=author_version),
+            self.detail_cache_timeout)
+        return Response(data)
+
+    @action(
+        detail=True, methods=['get'],
+        serializer_class=serializers.SimilarRecipeSerializer)
+    def similar(self, request, *args, **kwargs):
+        try:
+            pk = int(self.kwargs['pk'])
+        except ValueError:
+            raise NotFound
+        rows = (
+            models.SimilarRecipe.objects
+            .filter(recipe=pk)
+            .select_related('similar_to')
+            .defer('similar_to__search_vector')
+            .order_by('-score', '-similar_to__id')
+        )
+        recipes = []
+        for row in rows:
+            row.similar_to.similarity = row.score
+            recipes.append(row.similar_to)
+        if not recipes:
+            get_object_or_404(models.Recipe, pk=pk)
+        return Response(self.get_serializer(recipes, many=True).data)
+
+    def update(self, request, *args, **kwargs):
+        # Unlike UpdateModelMixin.update, keep the prefetch cache: the
+        # serializer refills it with the saved ingredient rows
+        instance = self.get_object()
+        serializer = self.get_serializer(
+            instance, data=request.data, partial=kwargs.pop('partial', False))
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        return Response(serializer.data)
+
+    def overlay_user_flags(self, data):
+        user = self.request.user
+        flags = {
+            'is_favorited': False,
+            'is_in_shopping_cart': False,
+            'is_subscribed': False,
+        }
+        if user.is_authenticated:
+            flags = models.User.objects.filter(pk=user.pk).values(
+                is_favorited=Exists(models.Favorite.objects.filter(
+                    user=OuterRef('pk'), recipe=data['id'])),
+                is_in_shopping_cart=Exists(
+                    models.ShoppingCartItem.objects.filter(
+                        user=OuterRef('pk'), recipe=data['id'])),
+                is_subscribed=Exists(models.Subscription.objects.filter(
+                    user=OuterRef('pk'),
+                    subscribed_to=data['author']['id'])),
+            ).get()
+
+        data['author']['is_subscribed'] = flags.pop('is_subscribed')
+        return data | flags
+
+    def get_queryset(self):
+        queryset = (
+            models.Recipe.objects
+            .select_related('author', 'author__profile')
+            .prefetch_related(Prefetch(
+                'ingredients',
+                queryset=(
+                    models.RecipeIngredient.objects
+                    .select_related('ingredient')
+                    .order_by('ingredient__name')
+                )
+            ))
+        )
+        user = self.request.user
+
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+                is_author_subscribed=Value(False))
+
+        return queryset.annotate(
+            is_favorited=Exists(models.Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(models.ShoppingCartItem.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_author_subscribed=Exists(models.Subscription.objects.filter(
+                user=user, subscribed_to=OuterRef('author'))))
+
+
+class FeedViewSet(mixins.ListModelMixin, GenericViewSet):
+    serializer_class = serializers.RecipeSerializer
+    pagination_class = pagination.KeysetPagination
+    permission_classes = (IsAuthenticated,)
+    cursor_ordering = ('-date_posted', '-recipe_id')
+
+    def get_queryset(self):
+        user = self.request.user
+        return (
+            models.FeedEntry.objects
+            .filter(user=user)
+            .select_related('recipe__author__profile')
+            .defer('recipe__search_vector')
+            .prefetch_related(Prefetch(
+                'recipe__ingredients',
+                queryset=(
+                    models.RecipeIngredient.objects
+                    .select_related('ingredient')
+                    .order_by('ingredient__name')
+                )
+            ))
+            .annotate(
+                is_favorited=Exists(models.Favorite.objects.filter(
+                    user=user, recipe=OuterRef('recipe'))),
+                is_in_shopping_cart=Exists(
+                    models.ShoppingCartItem.objects.filter(
+                        user=user, recipe=OuterRef('recipe'))))
+        )
+
+    def paginate_queryset(self, queryset):
+        recipes = []
+        for entry in super().paginate_queryset(queryset):
+            recipe = entry.recipe
+            recipe.is_favorited = entry.is_favorited
+            recipe.is_in_shopping_cart = entry.is_in_shopping_cart
+            # Feed entries only exist for followed authors
+            recipe.is_author_subscribed = True
+            recipes.append(recipe)
+        return recipes
+
+
+class PantryView(APIView):
+    permission_classes = (AllowAny,)
+    default_limit = 10
+    max_limit = 100
+
+    def get(self, request, *args, **kwargs):
+        ingredient_ids = filters.param_get_ids(
+            request, 'ingredients', max_count=pantry.MAX_PANTRY_SIZE)
+        if ingredient_ids is None:
+            raise ValidationError({'ingredients': 'required'})
+        limit = filters.param_get_limit(
+            request, 'limit', self.default_limit, self.max_limit)
+
+        matches = pantry.match(ingredient_ids, limit)
+        recipes = models.Recipe.objects.in_bulk(
+            [match['recipe_id'] for match in matches])
+        ingredients = ingredient_index.get_many({
+            ingredient_id
+            for match in matches
+            for ingredient_id, _ in match['missing']
+        })
+
+        results = []
+        for match in matches:
+            recipe = recipes.get(match['recipe_id'])
+            if recipe is None:
+                continue
+            results.append({
+                'recipe': recipe,
+                'coverage': match['coverage'],
+                'missing': [
+                    {
+                        'id': ingredient_id,
+                        'name': ingredients[ingredient_id].name,
+                        'measurement_unit': (
+                            ingredients[ingredient_id].measurement_unit),
+                        'amount': amount,
+                    }
+                    for ingredient_id, amount in match['missing']
+                    if ingredient_id in ingredients
+                ],
+            })
+        return Response(serializers.PantryMatchSerializer(
+            results, many=True, context={'request': request}).data)
 
 
 class RecipeLinkView(APIView):
@@ -92,65 +373,72 @@ class RecipeLinkView(APIView):
 
 
 class AddRemoveRecipeView(APIView):
-    def get_queryset(self, request) -> QuerySet:
-        raise NotImplementedError
+    model: type[models.Favorite | models.ShoppingCartItem]
 
     def post(self, request, id, *args, **kwargs):
+        instance = self.model.objects.create_unique(request.user, recipe=id)
         recipe = get_object_or_404(models.Recipe, pk=id)
-        queryset = self.get_queryset(request).filter(recipe=recipe)
-        if queryset.exists():
+        if instance is None:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        queryset.create(
-            user=request.user, recipe=recipe)
-
         serializer = serializers.RecipeMinifiedSerializer(
             instance=recipe, context={'request': self.request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, id, *args, **kwargs):
-        recipe = get_object_or_404(models.Recipe, pk=id)
-        queryset = self.get_queryset(request).filter(recipe=recipe)
-        if not queryset.exists():
+        instance = self.model.objects.delete_unique(request.user, recipe=id)
+        if instance is None:
+            get_object_or_404(models.Recipe, pk=id)
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        queryset.delete()
-
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class FavoriteView(AddRemoveRecipeView):
-    def get_queryset(self, request) -> QuerySet:
-        return request.user.favorites
+    model = models.Favorite
 
 
 class ShoppingCartView(AddRemoveRecipeView):
-    def get_queryset(self, request) -> QuerySet:
-        return request.user.shopping_cart
+    model = models.ShoppingCartItem
 
 
 class DownloadShoppingCartView(APIView):
-    def get(self, request, *args, **kwargs):
-        recipes = models.Recipe.objects.filter(
-            in_shopping_carts__user=request.user)
-
-        filter_arg = Q(recipe_ingredients__recipe__in=recipes)
-
-        ingredients = (
-            models.Ingredient.objects
-            .filter(filter_arg)
-            .annotate(total_sum=aggregates.Sum(
-                'recipe_ingredients__amount', filter=filter_arg))
-            .values_list('name', 'measurement_unit', 'total_sum')
-        )
+    cache_timeout = 60 * 60
 
-        file_content = '\n'.join([
-            f"{name} ({unit}) - {amount}"
-            for name, unit, amount in ingredients
-        ])
+    def perform_content_negotiation(self, request, force=False):
+        # ?format= selects the export format rather than a renderer
+        return super().perform_content_negotiation(request, force=True)
 
-        response = HttpResponse(file_content, content_type='text/plain')
-        response['Content-Disposition'] = (
-            'attachment; filename="Shopping list.txt"'
-        )
-        return response
+    def get(self, request, *args, **kwargs):
+        export_format = request.query_params.get('format', 'txt')
+        if export_format not in shopping_list.EXPORT_FORMATS:
+            raise ValidationError({'format': 'unsupported export format'})
+        content_type, export = shopping_list.EXPORT_FORMATS[export_format]
+
+        version = shopping_list.get_version(request.user.pk)
+        etag = f'"{request.user.pk}-{export_format}-{version}"'
+        headers = {
+            'ETag': etag,
+            'Content-Disposition': (
+                f'attachment; filename="Shopping list.{export_format}"'),
+        }
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return HttpResponseNotModified(headers=headers)
+
+        cache_key = f'shopping-list-export:{etag}'
+        content = cache.get(cache_key)
+        if content is not None:
+            return HttpResponse(
+                content, content_type=content_type, headers=headers)
+
+        return StreamingHttpResponse(
+            self.cache_stream(
+                export(shopping_list.iter_items(request.user)), cache_key),
+            content_type=content_type, headers=headers)
+
+    def cache_stream(self, chunks, cache_key):
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        cache.set(cache_key, ''.join(parts), self.cache_timeout)